@@ -0,0 +1,320 @@
+"""
+Бенчмарки горячих путей мониторинга задач на синтетическом хранилище Obsidian.
+
+Запуск:
+    python benchmarks/bench.py run --files 2000 --tasks 20 --output bench.json
+    python benchmarks/bench.py compare old.json new.json --threshold 0.1
+
+Работает без сети: отправка в Telegram заменяется заглушкой.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+DEFAULT_MIX = {
+    'done': 0.4,
+    'complexity': 0.5,
+    'date': 0.3,
+    'completed_date': 0.3,
+    'tomato': 0.25,
+    'reminder': 0.1
+}
+
+WORDS = [
+    'позвонить', 'отчет', 'встреча', 'купить', 'проверить', 'invoice', 'review',
+    'deploy', 'проект', 'клиент', 'письмо', 'документы', 'план', 'бюджет', 'задача'
+]
+
+
+def parse_mix(value):
+    """Разбирает строку вида "date=0.3,reminder=0.1" поверх DEFAULT_MIX"""
+    mix = dict(DEFAULT_MIX)
+    if value:
+        for item in value.split(','):
+            key, _, share = item.partition('=')
+            if key not in mix:
+                raise argparse.ArgumentTypeError(f"Неизвестный вид метаданных: {key}")
+            mix[key] = float(share)
+    return mix
+
+
+def generate_task_line(rnd, mix, now):
+    """Генерирует строку задачи со случайным набором метаданных"""
+    done = rnd.random() < mix['done']
+    parts = ['- [x]' if done else '- [ ]']
+
+    if rnd.random() < mix['complexity']:
+        parts.append(rnd.choice(['🟩', '🟨', '🟥']))
+    parts.append(' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 8))))
+
+    if rnd.random() < mix['reminder']:
+        # Половина напоминаний в будущем, половина в прошлом
+        reminder = now + timedelta(minutes=rnd.randint(-30 * 24 * 60, 30 * 24 * 60))
+        parts.append(f"(@{reminder.strftime('%Y-%m-%d %H:%M')})")
+    if rnd.random() < mix['date']:
+        day = now + timedelta(days=rnd.randint(-60, 60))
+        parts.append(f"📅 {day.strftime('%Y-%m-%d')}")
+    if rnd.random() < mix['tomato']:
+        parts.append(f"[🍅::{rnd.randint(1, 8)}]")
+    if done and rnd.random() < mix['completed_date']:
+        day = now - timedelta(days=rnd.randint(0, 60))
+        parts.append(f"✅ {day.strftime('%Y-%m-%d')}")
+
+    return ' '.join(parts)
+
+
+def generate_vault(path, files, tasks_per_file, text_lines_per_file=10, mix=None,
+                   files_per_dir=100, seed=0):
+    """
+    Создает синтетическое хранилище: files .md файлов по files_per_dir в каталоге,
+    в каждом tasks_per_file задач вперемешку с text_lines_per_file строками текста.
+    Возвращает список путей созданных файлов.
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    now = datetime.now()
+    paths = []
+
+    for index in range(files):
+        directory = os.path.join(path, f"folder-{index // files_per_dir:04d}")
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"note-{index:06d}.md")
+
+        lines = [f"# Заметка {index}", ""]
+        lines += [generate_task_line(rnd, mix, now) for _ in range(tasks_per_file)]
+        lines += [' '.join(rnd.choice(WORDS) for _ in range(12)) for _ in range(text_lines_per_file)]
+        rnd.shuffle(lines)
+
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        paths.append(file_path)
+
+    return paths
+
+
+def measure(name, fn, ops, repeat):
+    """Выполняет fn repeat раз, возвращает лучшее и медианное время"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    result = {
+        'ops': ops,
+        'best_seconds': best,
+        'median_seconds': statistics.median(timings),
+        'ops_per_second': ops / best if best > 0 else None
+    }
+    print(f"{name:32} {best * 1000:10.2f} мс  {result['ops_per_second'] or 0:14.0f} оп/с  (ops={ops})")
+    return result
+
+
+def run_benchmarks(args, workdir):
+    vault_path = os.path.join(workdir, 'vault')
+
+    print(f"Генерация хранилища: {args.files} файлов по {args.tasks} задач в {vault_path}")
+    file_paths = generate_vault(vault_path, args.files, args.tasks, args.text_lines,
+                                mix=args.mix, seed=args.seed)
+
+    # main читает настройки из окружения при импорте
+    os.environ['VAULT_PATH'] = vault_path
+    os.environ['PARSE_CACHE_PATH'] = ''
+    os.environ['TELEGRAM_BOT_TOKEN'] = 'benchmark'
+    os.environ['TELEGRAM_CHAT_ID'] = 'benchmark'
+    os.environ['SCAN_WORKERS'] = str(args.workers)
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.abspath(SRC_PATH))
+
+    import main
+
+    if args.with_logging:
+        main.setup_logging(log_file=False)
+    else:
+        logging.disable(logging.INFO)
+
+    # Заглушка Telegram: сообщения не уходят в сеть
+    sent_messages = []
+
+    async def fake_send_message(chat_id, text, parse_mode='Markdown'):
+        sent_messages.append(text)
+        return True
+
+    main.telegram_client.send_message = fake_send_message
+    vault = main.default_vault
+
+    rnd = random.Random(args.seed)
+    results = {}
+
+    task_lines = []
+    for file_path in file_paths:
+        with open(file_path, encoding='utf-8') as f:
+            task_lines.extend(line for line in f if line.startswith('- ['))
+    task_lines = task_lines[:args.max_lines]
+
+    results['parse_obsidian_task'] = measure(
+        'parse_obsidian_task',
+        lambda: [main.parse_obsidian_task(line, 'bench.md') for line in task_lines],
+        len(task_lines), args.repeat)
+
+    results['parse_obsidian_file'] = measure(
+        'parse_obsidian_file',
+        lambda: [main.parse_obsidian_file(file_path) for file_path in file_paths],
+        len(file_paths), args.repeat)
+
+    results['scan_all_files'] = measure(
+        'scan_all_files', main.scan_all_files, len(file_paths), args.repeat)
+
+    vault.parse_cache_path = os.path.join(workdir, 'cache', 'parse_cache.pickle')
+    main.scan_all_files()
+    results['scan_all_files_cached'] = measure(
+        'scan_all_files (теплый кэш)', main.scan_all_files, len(file_paths), args.repeat)
+    vault.parse_cache_path = ''
+
+    checks = 1000
+
+    async def run_checks():
+        for _ in range(checks):
+            await main.check_notifications()
+        if main.pending_sends:
+            await asyncio.gather(*main.pending_sends)
+
+    results['check_notifications'] = measure(
+        'check_notifications', lambda: asyncio.run(run_checks()), checks, args.repeat)
+
+    summaries = 100
+    results['get_summary_data'] = measure(
+        'get_summary_data',
+        lambda: [main.get_summary_data(vault.stats, vault.timezone) for _ in range(summaries)],
+        summaries, args.repeat)
+
+    handler = main.SyncHandler(vault)
+    storm = [rnd.choice(file_paths) for _ in range(args.events)]
+    results['sync_event_storm'] = measure(
+        'SyncHandler (шторм событий)',
+        lambda: [handler.update_file_tasks(file_path) for file_path in storm],
+        len(storm), args.repeat)
+
+    # Шторм с напоминаниями, наступающими сейчас: проверка + отправка через заглушку
+    due_time = (datetime.now(vault.timezone) + timedelta(minutes=2)).strftime('%Y-%m-%d %H:%M')
+    due_files = file_paths[:args.due_files]
+
+    def run_due_burst():
+        for index, file_path in enumerate(due_files):
+            tasks = [main.parse_obsidian_task(f"- [ ] due task {index}-{n} (@{due_time})", file_path)
+                     for n in range(5)]
+            vault.tasks.replace_file(file_path, tasks)
+        asyncio.run(run_checks())
+
+    results['due_notifications_burst'] = measure(
+        'check_notifications (пачка)', run_due_burst, len(due_files) * 5, 1)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'files': args.files,
+            'tasks_per_file': args.tasks,
+            'text_lines_per_file': args.text_lines,
+            'mix': args.mix,
+            'workers': args.workers,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'total_tasks': len(vault.tasks)
+        },
+        'results': results
+    }
+
+
+def compare_results(old_path, new_path, threshold):
+    """Сравнивает два прогона, возвращает количество регрессий"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)['results']
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'бенчмарк':32} {'было, мс':>12} {'стало, мс':>12} {'изменение':>10}")
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            print(f"{name:32} {'-' if name not in old else '':>12} {'-' if name not in new else '':>12}")
+            continue
+
+        # Сравниваем время на одну операцию, чтобы прогоны разного размера были сопоставимы
+        old_per_op = old[name]['best_seconds'] / max(old[name]['ops'], 1)
+        new_per_op = new[name]['best_seconds'] / max(new[name]['ops'], 1)
+        change = (new_per_op - old_per_op) / old_per_op if old_per_op else 0.0
+
+        flag = ''
+        if change > threshold:
+            flag = '  РЕГРЕССИЯ'
+            regressions += 1
+        print(f"{name:32} {old[name]['best_seconds'] * 1000:12.2f} {new[name]['best_seconds'] * 1000:12.2f} "
+              f"{change * 100:+9.1f}%{flag}")
+
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Бенчмарки obsidian-utils')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Запустить бенчмарки')
+    run_parser.add_argument('--files', type=int, default=1000, help='Количество файлов')
+    run_parser.add_argument('--tasks', type=int, default=20, help='Задач в файле')
+    run_parser.add_argument('--text-lines', type=int, default=10, help='Строк текста в файле')
+    run_parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                            help='Доли метаданных, например "date=0.3,reminder=0.1"')
+    run_parser.add_argument('--workers', type=int, default=1, help='SCAN_WORKERS для сканирования')
+    run_parser.add_argument('--events', type=int, default=500, help='Событий в шторме SyncHandler')
+    run_parser.add_argument('--due-files', type=int, default=20, help='Файлов с наступающими напоминаниями')
+    run_parser.add_argument('--max-lines', type=int, default=50000, help='Максимум строк для parse_obsidian_task')
+    run_parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого замера')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--with-logging', action='store_true', help='Не отключать INFO-логи')
+    run_parser.add_argument('--keep', action='store_true', help='Не удалять сгенерированное хранилище')
+    run_parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    compare_parser = subparsers.add_parser('compare', help='Сравнить два прогона')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Допустимое замедление на операцию (0.1 = 10%%)')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        regressions = compare_results(args.old, args.new, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='obsidian-bench-')
+    try:
+        report = run_benchmarks(args, workdir)
+    finally:
+        os.chdir(os.path.dirname(workdir))
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {output}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,62 @@
+"""
+Микробенчмарк parse_obsidian_task: строк задач в секунду на эталонном корпусе.
+
+Запуск:
+    python benchmarks/parse_lines.py
+    python benchmarks/parse_lines.py --corpus my_lines.txt --repeat 10
+
+Корпус по умолчанию - tests/data/task_lines.txt (тот же, что в тесте разбора задач).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SRC_PATH = os.path.join(BASE_PATH, 'src')
+DEFAULT_CORPUS = os.path.join(BASE_PATH, 'tests', 'data', 'task_lines.txt')
+# Признаки метаданных: строки с ними и без них разбираются по-разному
+METADATA_MARKS = ('📅', '✅', '(@', '[🍅', '@completed', '🟩', '🟨', '🟥')
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read().split('\n')[:-1]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Скорость разбора строк задач')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Файл со строками задач, по одной в строке')
+    parser.add_argument('--repeat', type=int, default=5, help='Число повторов (берется лучший)')
+    args = parser.parse_args()
+
+    # main читает настройки из окружения при импорте
+    os.environ.setdefault('PARSE_CACHE_PATH', '')
+    os.environ.setdefault('SENT_STORE_PATH', '')
+    sys.path.insert(0, os.path.abspath(SRC_PATH))
+
+    from main import parse_obsidian_task
+
+    lines = read_lines(args.corpus)
+    groups = {
+        'все строки': lines,
+        'с метаданными': [line for line in lines if any(mark in line for mark in METADATA_MARKS)],
+        'без метаданных': [line for line in lines if not any(mark in line for mark in METADATA_MARKS)],
+    }
+
+    for name, group in groups.items():
+        if not group:
+            continue
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for line in group:
+                parse_obsidian_task(line, 'bench.md')
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:16} {len(group):8} строк  {best * 1000:9.2f} мс  {len(group) / best:12.0f} строк/с")
+
+
+if __name__ == '__main__':
+    main_cli()
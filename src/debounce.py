@@ -0,0 +1,87 @@
+"""
+Склейка событий файловой системы по пути
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventDebouncer:
+    """
+    Копит события по пути и вызывает callback(path, action) один раз,
+    когда по этому пути не было новых событий в течение delay секунд.
+    Последнее действие для пути ('update' или 'delete') побеждает.
+    callback всегда выполняется в собственном потоке (и при delay=0),
+    поэтому поток, вызывающий push(), не ждет обработки.
+    """
+
+    def __init__(self, delay, callback, name='event-debouncer'):
+        self.delay = max(0.0, delay)
+        self.callback = callback
+        self.name = name
+        # path -> (срок срабатывания, действие)
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, path, action):
+        with self._condition:
+            self._pending[path] = (time.monotonic() + self.delay, action)
+            self._condition.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Немедленно обрабатывает все накопленные события"""
+        with self._condition:
+            pending = list(self._pending.items())
+            self._pending.clear()
+        for path, (_, action) in pending:
+            self._dispatch(path, action)
+
+    def _dispatch(self, path, action):
+        try:
+            self.callback(path, action)
+        except Exception as e:
+            logger.error(f"Ошибка обработки события {action} для {path}: {e}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+
+                now = time.monotonic()
+                ready = [path for path, (deadline, _) in self._pending.items() if deadline <= now]
+                if not ready:
+                    timeout = None
+                    if self._pending:
+                        timeout = min(deadline for deadline, _ in self._pending.values()) - now
+                    self._condition.wait(timeout)
+                    continue
+
+                events = [(path, self._pending.pop(path)[1]) for path in ready]
+
+            for path, action in events:
+                self._dispatch(path, action)
@@ -0,0 +1,112 @@
+"""
+Неблокирующий вывод логов, прогресс долгих операций и прореживание повторяющихся сообщений
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+# Слушатель очереди логов текущего процесса
+_listener = None
+
+
+def start_queue_logging(handlers, level=logging.INFO):
+    """
+    Направляет логи корневого логгера в очередь, а запись в handlers (консоль, файл)
+    выполняет фоновый поток. Вызывающий поток не ждет вывода в консоль и ротации файла.
+    """
+    global _listener
+
+    from logging.handlers import QueueHandler, QueueListener
+
+    stop_queue_logging()
+    log_queue = queue.SimpleQueue()
+    # Сообщения форматируются обработчиками слушателя, у QueueHandler формат по умолчанию
+    queue_handler = QueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_queue_logging():
+    """Останавливает слушателя, предварительно выведя остаток очереди"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_logging)
+
+
+def use_direct_handlers():
+    """
+    В процессе пула, созданном через fork, нет потока слушателя: логи пишутся
+    напрямую в унаследованные обработчики, как без очереди.
+    """
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+
+
+class ProgressLog:
+    """
+    Пишет прогресс долгой операции не чаще раза в interval секунд
+    вместо отдельного сообщения на каждый элемент.
+    """
+
+    def __init__(self, logger, label, total, interval=5.0):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if self.interval > 0 and now - self._last >= self.interval and self.done < self.total:
+            self._last = now
+            rate = self.done / max(now - self.started, 1e-9)
+            self.logger.info(f"{self.label}: {self.done}/{self.total} ({rate:.0f}/с)")
+
+
+class LogSampler:
+    """
+    Прореживает повторяющиеся сообщения: при rate=0.1 выводится каждое десятое сообщение
+    с данным ключом, к нему добавляется число пропущенных. rate=1 - выводятся все.
+    """
+
+    def __init__(self, rate=1.0):
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._skipped = {}
+        self._lock = threading.Lock()
+
+    def log(self, logger, level, key, message):
+        if not self.every or not logger.isEnabledFor(level):
+            return
+        with self._lock:
+            skipped = self._skipped.get(key, 0)
+            if skipped + 1 < self.every:
+                self._skipped[key] = skipped + 1
+                return
+            self._skipped[key] = 0
+        if skipped:
+            message = f"{message} (похожих сообщений пропущено: {skipped})"
+        logger.log(level, message)
@@ -1,48 +1,72 @@
 import time
-import shutil
+import mmap
 import os
+import sys
 import re
 import json
-import asyncio
-import aiohttp
+import argparse
+import threading
 import pytz
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from collections import Counter
+from itertools import repeat
 from datetime import datetime, timedelta
-from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
-from watchdog.events import FileSystemEventHandler
-from jinja2 import Environment, BaseLoader
+from typing import Optional
 
 # Импортируем шаблоны и функции для работы с контекстом
-from templates import load_template, get_template_context, get_summary_data
-
-# Создаем директорию для логов, если она не существует
-os.makedirs('logs', exist_ok=True)
-
-# Настройка ротации логов
-log_handler = TimedRotatingFileHandler(
-    filename='logs/task_monitor.log',
-    when='midnight',  # Ротация в полночь
-    interval=1,  # Каждый день
-    backupCount=10,  # Хранить 10 файлов (10 дней)
-    encoding='utf-8'
-)
-
-# Формат имени для ротированных файлов (добавит дату к имени)
-log_handler.suffix = "%Y-%m-%d"
+from templates import load_template, get_template_context, get_summary_data, TEMPLATE_CONFIG, TEMPLATES_DIR
+from schedule import NotificationSchedule, notification_key, wait_any
+from task_store import TaskStore
+from task_stats import TaskStats
+from task_diff import match_tasks
+from task_record import Task, parse_notification_time, to_epoch_day
+from parse_cache import ParseCache
+from sent_store import SentStore
+from task_index import TaskIndex
+from text_index import TaskTextIndex, search_sort_key
+from task_export import ColumnarExport, load_columns, monthly_stats
+from query_api import start_query_api
+from debounce import EventDebouncer
+from telegram_client import TelegramClient
+from metrics import Counter as MetricCounter, Gauge, Histogram, start_metrics_server
+from logging_utils import LogSampler, ProgressLog, start_queue_logging, use_direct_handlers
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Вывод в консоль
-        log_handler  # Ротируемый вывод в файл
-    ]
-)
 logger = logging.getLogger(__name__)
 
+
+def setup_logging(level=logging.INFO, log_file=True):
+    """
+    Настраивает вывод логов в консоль и (для долгоживущих команд) в ротируемый файл.
+    Вызывается при запуске из командной строки, а не при импорте модуля.
+    Запись в консоль и файл выполняет фоновый поток, логирующий поток только ставит сообщение в очередь.
+    """
+    handlers = [logging.StreamHandler()]  # Вывод в консоль
+
+    if log_file:
+        from logging.handlers import TimedRotatingFileHandler
+
+        # Создаем директорию для логов, если она не существует
+        os.makedirs('logs', exist_ok=True)
+
+        # Настройка ротации логов
+        log_handler = TimedRotatingFileHandler(
+            filename='logs/task_monitor.log',
+            when='midnight',  # Ротация в полночь
+            interval=1,  # Каждый день
+            backupCount=10,  # Хранить 10 файлов (10 дней)
+            encoding='utf-8'
+        )
+
+        # Формат имени для ротированных файлов (добавит дату к имени)
+        log_handler.suffix = "%Y-%m-%d"
+        handlers.append(log_handler)  # Ротируемый вывод в файл
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    start_queue_logging(handlers, level)
+
+
 VAULT_PATH = os.getenv('VAULT_PATH', '/home/aborisov/projects/my/obsidian-utils/source/daily')
 task_pattern_open = u'- [ ]'
 task_pattern_close = u'- [x]'
@@ -51,160 +75,624 @@ task_pattern_close = u'- [x]'
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', 'your_bot_token_here')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', 'your_chat_id_here')
 TIMEZONE = os.getenv('TIMEZONE', 'Europe/Samara')
-DURATION_TOMATO = int(os.getenv('TIMEZONE', 30))
+# Базовый адрес Bot API (для тестов можно указать локальную заглушку)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+# Минимальный интервал между сообщениями в один чат (сек) и общий лимит запросов в секунду
+TELEGRAM_CHAT_INTERVAL = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 1.0))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+# Команды бота /find и /today через длинный опрос getUpdates (отвечает только чатам хранилищ)
+TELEGRAM_BOT_COMMANDS = os.getenv('TELEGRAM_BOT_COMMANDS', 'false').lower() in ('1', 'true', 'yes')
+# Время ожидания одного запроса getUpdates (сек) и число задач в ответе на команду
+BOT_POLL_TIMEOUT = int(os.getenv('BOT_POLL_TIMEOUT', 25))
+BOT_RESULTS_LIMIT = int(os.getenv('BOT_RESULTS_LIMIT', 10))
+# Объединять напоминания, наступившие одновременно, в одно сообщение
+NOTIFICATION_BATCHING = os.getenv('NOTIFICATION_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+# Пауза (сек) перед повторной отправкой пакета напоминаний, который не удалось доставить
+NOTIFICATION_RETRY_SECONDS = float(os.getenv('NOTIFICATION_RETRY_SECONDS', 30))
+DURATION_TOMATO = int(os.getenv('DURATION_TOMATO', 30))
+# Максимальная пауза основного цикла между проверками уведомлений (сек)
+NOTIFICATION_MAX_SLEEP = int(os.getenv('NOTIFICATION_MAX_SLEEP', 300))
+# Кэш распарсенных задач между перезапусками (пустое значение отключает кэш)
+PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', 'cache/parse_cache.pickle')
+PARSE_CACHE_HASH = os.getenv('PARSE_CACHE_HASH', 'false').lower() in ('1', 'true', 'yes')
+# Количество процессов для первоначального сканирования (1 - последовательно, 0 - по числу ядер)
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 1))
+SCAN_BATCH_SIZE = int(os.getenv('SCAN_BATCH_SIZE', 64))
+# Бэкенд наблюдения за файлами: auto (inotify с откатом на опрос), native, polling
+OBSERVER_BACKEND = os.getenv('OBSERVER_BACKEND', 'auto').lower()
+# Интервал опроса (сек): сразу после изменений - минимальный, в простое растет до максимального
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', 1.0))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', 30.0))
+# .md файлы неизмененных каталогов проверяются на каждом N-м проходе опроса
+POLL_CHECK_FILES_EVERY = int(os.getenv('POLL_CHECK_FILES_EVERY', 1))
+# Окно склейки событий одного файла (сек), 0 - обрабатывать каждое событие сразу
+EVENT_DEBOUNCE_SECONDS = float(os.getenv('EVENT_DEBOUNCE_SECONDS', 1.0))
+# Хранилище отправленных напоминаний (пустое значение - только в памяти)
+SENT_STORE_PATH = os.getenv('SENT_STORE_PATH', 'cache/sent.sqlite3')
+# Сколько секунд после времени напоминания хранить отметку об отправке
+SENT_STORE_GRACE = int(os.getenv('SENT_STORE_GRACE', 86400))
+# Файлы больше этого размера (байт) при сканировании читаются через mmap, а не целиком в память
+# (0 - отключить). Файлы из событий наблюдателя всегда читаются целиком, см. read_task_lines
+PARSE_MMAP_THRESHOLD = int(os.getenv('PARSE_MMAP_THRESHOLD', 1024 * 1024))
+# HTTP/JSON API запросов к задачам (порт 0 - отключено)
+API_HOST = os.getenv('API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('API_PORT', 0))
+# HTTP-эндпоинт метрик Prometheus (порт 0 - отключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+# Колоночная выгрузка задач для аналитики, дописывается при изменении файлов (пустое значение - отключена)
+TASK_EXPORT_PATH = os.getenv('TASK_EXPORT_PATH', '')
+# Файл настроек нескольких хранилищ (JSON). Если не задан, используется одно хранилище
+# из VAULT_PATH, TELEGRAM_CHAT_ID и TIMEZONE
+VAULTS_CONFIG = os.getenv('VAULTS_CONFIG', '')
+# Доля выводимых повторяющихся сообщений об изменениях файлов (1 - все, 0.1 - каждое десятое)
+LOG_EVENT_SAMPLE_RATE = float(os.getenv('LOG_EVENT_SAMPLE_RATE', 1.0))
+# Интервал сообщений о прогрессе сканирования (сек)
+LOG_PROGRESS_SECONDS = float(os.getenv('LOG_PROGRESS_SECONDS', 5.0))
+# Версия парсера: увеличивать при любом изменении формата задач, чтобы сбросить кэш
+PARSER_VERSION = 3
 
 
 timezone = pytz.timezone(TIMEZONE)
 
-# Инициализация Jinja2 environment
-jinja_env = Environment(loader=BaseLoader())
-
-# Кэш загруженных шаблонов
+# Метрики
+FILE_PARSE_SECONDS = Histogram('obsidian_file_parse_seconds', 'Time to parse one markdown file.')
+SCAN_SECONDS = Histogram(
+    'obsidian_scan_seconds', 'Time of a full vault scan.',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+FS_EVENTS = MetricCounter('obsidian_fs_events_total', 'File system events received by type.', ['type'])
+TASK_EVENTS = MetricCounter('obsidian_task_events_total', 'Task change events by kind.', ['kind'])
+REMINDER_DELAY_SECONDS = Histogram(
+    'obsidian_reminder_delay_seconds',
+    'Delay between the scheduled send time of a reminder (due time minus lead time) and its delivery.',
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+NOTIFICATIONS_SENT = MetricCounter('obsidian_notifications_total', 'Reminder deliveries by result.', ['result'])
+
+# Jinja2 environment создается при первом рендеринге
+jinja_env = None
+
+# Кэш загруженных шаблонов: (каталог шаблонов, имя) -> шаблон
 template_cache = {}
 
-# Глобальное хранилище задач
-all_tasks = []
-notification_sent = set()
+# Ключи доставленных напоминаний всех хранилищ проверяются в одном цикле,
+# поэтому расписания хранилищ делят одно условие ожидания
+schedule_condition = threading.Condition()
+# Прореживание сообщений об изменениях файлов (при массовых правках их тысячи)
+event_log = LogSampler(LOG_EVENT_SAMPLE_RATE)
+# Фоновые задачи отправки (ссылки нужны, чтобы задачи не собрал сборщик мусора)
+pending_sends = set()
+# Пул процессов парсинга, общий для всех хранилищ (создается при первом параллельном сканировании)
+parse_pool = None
+
+# Один клиент (и пул соединений) Telegram на все хранилища
+telegram_client = TelegramClient(
+    TELEGRAM_BOT_TOKEN,
+    api_url=TELEGRAM_API_URL,
+    chat_interval=TELEGRAM_CHAT_INTERVAL,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    max_retries=TELEGRAM_MAX_RETRIES
+)
+
 
+class Vault:
+    """
+    Хранилище Obsidian со своим чатом, часовым поясом, шаблонами и индексом задач.
+    Наблюдатель за файлами, пул процессов парсинга и клиент Telegram общие для всех хранилищ.
+    """
 
-def get_template(template_name: str) -> str:
+    def __init__(self, name, path, chat_id, timezone_name, templates_dir=None,
+                 parse_cache_path='', sent_store_path='', export_path=''):
+        self.name = name
+        self.path = os.path.abspath(path)
+        self.chat_id = chat_id
+        self.timezone_name = timezone_name
+        self.timezone = pytz.timezone(timezone_name)
+        self.templates_dir = templates_dir or TEMPLATES_DIR
+        self.parse_cache_path = parse_cache_path
+
+        # Хранилище задач (индекс по абсолютному пути файла)
+        self.tasks = TaskStore()
+        # Ключи доставленных напоминаний, переживают перезапуск
+        self.sent = SentStore(sent_store_path, grace=SENT_STORE_GRACE)
+        # Ключи напоминаний, отправка которых еще не завершена
+        self.in_flight = set()
+
+        self.schedule = NotificationSchedule(self.timezone, condition=schedule_condition)
+        self.tasks.subscribe(self.schedule)
+        # Счетчики для сводки обновляются вместе с хранилищем
+        self.stats = TaskStats()
+        self.tasks.subscribe(self.stats)
+        # Вторичные индексы для API запросов и /today строятся, только если они включены
+        self.index = TaskIndex()
+        if API_PORT or TELEGRAM_BOT_COMMANDS:
+            self.tasks.subscribe(self.index)
+        # Слова текста задач для /find
+        self.text_index = TaskTextIndex()
+        if TELEGRAM_BOT_COMMANDS:
+            self.tasks.subscribe(self.text_index)
+        # Колоночная выгрузка дописывается блоками измененных файлов
+        self.export = None
+        if export_path:
+            self.export = ColumnarExport(export_path, self.tasks)
+            self.tasks.subscribe(self.export)
+
+    def normalize_path(self, filename):
+        return normalize_path(filename, self.path)
+
+    def index_version(self):
+        # Длительность задач зависит от DURATION_TOMATO, а время напоминаний - от часового пояса,
+        # поэтому они входят в версию кэша
+        return f"{PARSER_VERSION}:{DURATION_TOMATO}:{self.timezone_name}"
+
+
+def load_vaults(config_path):
+    """
+    Создает хранилища из файла настроек VAULTS_CONFIG:
+    {"vaults": [{"name": "work", "path": "/app/notes/work", "chat_id": "123",
+                 "timezone": "Europe/Moscow", "templates_dir": "/app/templates/work"}, ...]}
+    Необязательные поля берутся из переменных окружения, кэши хранилища лежат в cache/<name>/.
+    Без файла настроек возвращает одно хранилище из VAULT_PATH, TELEGRAM_CHAT_ID и TIMEZONE.
+    """
+    if not config_path:
+        return [Vault(
+            'default', VAULT_PATH, TELEGRAM_CHAT_ID, TIMEZONE,
+            parse_cache_path=PARSE_CACHE_PATH,
+            sent_store_path=SENT_STORE_PATH,
+            export_path=TASK_EXPORT_PATH
+        )]
+
+    with open(config_path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    vaults = []
+    for item in config['vaults']:
+        name = item['name']
+        if any(vault.name == name for vault in vaults):
+            raise ValueError(f"Хранилище {name} указано в {config_path} несколько раз")
+
+        cache_dir = os.path.join('cache', name)
+        vaults.append(Vault(
+            name, item['path'],
+            item.get('chat_id', TELEGRAM_CHAT_ID),
+            item.get('timezone', TIMEZONE),
+            templates_dir=item.get('templates_dir'),
+            # Пустой путь в окружении отключает кэш и для хранилищ из файла настроек
+            parse_cache_path=item.get(
+                'parse_cache_path', os.path.join(cache_dir, 'parse_cache.pickle') if PARSE_CACHE_PATH else ''),
+            sent_store_path=item.get(
+                'sent_store_path', os.path.join(cache_dir, 'sent.sqlite3') if SENT_STORE_PATH else ''),
+            export_path=item.get(
+                'export_path', os.path.join(cache_dir, 'tasks.columns') if TASK_EXPORT_PATH else '')
+        ))
+
+    if not vaults:
+        raise ValueError(f"В {config_path} не указано ни одного хранилища")
+    return vaults
+
+
+vaults = load_vaults(VAULTS_CONFIG)
+# Хранилище по умолчанию (единственное, если файл настроек не задан)
+default_vault = vaults[0]
+
+Gauge('obsidian_tasks', 'Tasks in the index by status.', ['vault', 'status'],
+      fn=lambda: {(vault.name, status): count for vault in vaults for status, count in vault.stats.status_counts().items()})
+Gauge('obsidian_pending_reminders', 'Reminders waiting in the notification schedule.', ['vault'],
+      fn=lambda: {vault.name: len(vault.schedule) for vault in vaults})
+Gauge('obsidian_sent_reminders', 'Delivered reminder keys kept to prevent duplicate sends.', ['vault'],
+      fn=lambda: {vault.name: len(vault.sent) for vault in vaults})
+
+
+def get_template(template_name: str, templates_dir: str = TEMPLATES_DIR) -> str:
     """
-    Получает шаблон из кэша или загружает из файла
+    Получает шаблон из кэша или загружает из файла.
+    Шаблона нет в каталоге хранилища - используется общий шаблон из TEMPLATES_DIR.
     """
-    if template_name not in template_cache:
+    global jinja_env
+
+    key = (templates_dir, template_name)
+    if key not in template_cache:
+        if jinja_env is None:
+            from jinja2 import Environment, BaseLoader
+            jinja_env = Environment(loader=BaseLoader())
         try:
-            template_content = load_template(template_name)
-            template_cache[template_name] = jinja_env.from_string(template_content)
-            logger.debug(f"Шаблон {template_name} загружен из файла")
+            if templates_dir != TEMPLATES_DIR and not os.path.exists(os.path.join(templates_dir, f"{template_name}.j2")):
+                template_cache[key] = get_template(template_name)
+                return template_cache[key]
+            template_content = load_template(template_name, templates_dir)
+            template_cache[key] = jinja_env.from_string(template_content)
+            logger.debug(f"Шаблон {template_name} загружен из {templates_dir}")
         except Exception as e:
             logger.error(f"Ошибка загрузки шаблона {template_name}: {e}")
             # Возвращаем простой fallback шаблон
             fallback_template = "{{ task }}"
-            template_cache[template_name] = jinja_env.from_string(fallback_template)
+            template_cache[key] = jinja_env.from_string(fallback_template)
 
-    return template_cache[template_name]
+    return template_cache[key]
 
 
-def parse_obsidian_task(s: str, filename: str = "") -> dict:
-    match = re.search(r"-\s*\[(?P<status>[\w\s\/])\]\s*(?P<data>[^:].*)", s)
-    complexity = 0
-    if match:
-        status = match.group('status')
-        data = match.group('data')
+# Строка задачи: "- [статус] текст"
+TASK_LINE_RE = re.compile(r"-\s*\[(?P<status>[\w\s\/])\]\s*(?P<data>[^:].*)")
 
-        if status == 'x':
-            ret = {'status': 'DONE'}
-        else:
-            ret = {'status': 'TODO'}
-
-        ret['filename'] = filename
-        ret['raw_line'] = s.strip()
-
-        if '🟩' in data:
-            data = data.replace('🟩', '')
-            ret['complexity'] = 1
-        if '🟨 ' in data:
-            data = data.replace('🟨', '')
-            ret['complexity'] = 2
-        if '🟥 ' in data:
-            data = data.replace('🟥', '')
-            ret['complexity'] = 3
-
-        if '📅' in data:
-            match_date = re.search(r"📅\s*(?P<date>\d{4}-\d{2}-\d{2})", data)
-            if match_date:
-                date = match_date.group('date')
-                ret['date'] = date
-                # Удаляем дату из текста
-                date_pattern = re.compile(r"📅\s*\d{4}-\d{2}-\d{2}")
-                data = date_pattern.sub('', data)
-
-        if '✅' in data:
-            match_completed_date = re.search(r"✅\s*(?P<completed_date>\d{4}-\d{2}-\d{2})", data)
-            if match_completed_date:
-                completed_date = match_completed_date.group('completed_date')
-                ret['completed_date'] = completed_date
-                data = data.replace(f"✅ {completed_date}", '')
-
-        if '@completed(' in data:
-            match_completed = re.search(r"@completed\((?P<completed>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\)", data)
-            if match_completed:
-                completed = match_completed.group('completed')
-                ret['completed'] = completed
-                data = data.replace(f"@completed({completed})", '')
-
-        ret['notification'] = None
-        if '(@' in data:
-            match_notification = re.search(r"\(@(?P<notification>\d{4}-\d{2}-\d{2}\s\d{1,2}:\d{2})\)", data)
-            if match_notification:
-                notification = match_notification.group('notification')
-                ret['notification'] = notification
-                data = data.replace(f"(@{notification})", '')
-
-        if '[🍅' in data:
-            match_duration = re.search(r"\[🍅::(?P<duration>\d+)\]", data)
-            if match_duration:
-                duration = int(match_duration.group('duration'))
-                ret['duration'] = duration * DURATION_TOMATO
-                # Удаляем помидорку из текста
-                data = re.sub(r'\s*\[🍅::\d+\]\s*', ' ', data)
+# Метаданные задачи, извлекаемые за один проход по тексту.
+# Каждая альтернатива начинается с литерала (квадраты сложности - без группы),
+# поэтому строки без меток просматриваются быстрым поиском по набору символов.
+TASK_TOKEN_RE = re.compile(
+    r"🟩|🟨|🟥"
+    r"|📅\s*(?P<date>\d{4}-\d{2}-\d{2})"
+    r"|✅\s*(?P<completed_date>\d{4}-\d{2}-\d{2})"
+    r"|@completed\((?P<completed>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\)"
+    r"|\(@(?P<notification>\d{4}-\d{2}-\d{2}\s\d{1,2}:\d{2})\)"
+    r"|\[🍅::(?P<duration>\d+)\]"
+)
+WHITESPACE_RE = re.compile(r"\s+")
+
+COMPLEXITY_LEVELS = {'🟩': 1, '🟨': 2, '🟥': 3}
+
+
+def parse_obsidian_task(s: str, filename: str = "", tz=None) -> Optional[Task]:
+    match = TASK_LINE_RE.search(s)
+    if not match:
+        return None
+
+    data = match.group('data')
+    found = {}
+    pieces = []
+    pos = 0
+
+    for token in TASK_TOKEN_RE.finditer(data):
+        kind = token.lastgroup
+        text = token.group(0)
+
+        if kind is None:
+            # Квадрат сложности; при нескольких побеждает максимальная сложность
+            found['complexity'] = max(found.get('complexity', 0), COMPLEXITY_LEVELS[text])
+            pieces.append(data[pos:token.start()])
+            pos = token.end()
+            continue
+
+        value = token.group(kind)
+        if kind == 'date' or kind == 'duration':
+            found.setdefault(kind, value)
         else:
-            ret['duration'] = 0
+            # Из текста удаляются только метки с первым найденным значением,
+            # для даты выполнения - только в каноничной записи "✅ ГГГГ-ММ-ДД"
+            first = found.setdefault(kind, value)
+            if first != value or (kind == 'completed_date' and text != f"✅ {value}"):
+                continue
+
+        pieces.append(data[pos:token.start()])
+        # Помидорка заменяется пробелом, остальные метки удаляются
+        if kind == 'duration':
+            pieces.append(' ')
+        pos = token.end()
+
+    if pieces:
+        pieces.append(data[pos:])
+        data = ''.join(pieces)
+
+    notification_at = None
+    if 'notification' in found:
+        notification_at = parse_notification_time(found['notification'], tz or timezone)
+        if notification_at is None:
+            logger.error(f"Ошибка парсинга времени: {found['notification']}")
+
+    if 'duration' in found:
+        duration = int(found['duration']) * DURATION_TOMATO
+    elif '[🍅' not in data:
+        duration = 0
+    else:
+        duration = None
 
+    return Task(
+        status='DONE' if match.group('status') == 'x' else 'TODO',
+        filename=filename,
+        raw_line=s.strip(),
         # Очищаем лишние пробелы
-        data = re.sub(r'\s+', ' ', data).strip()
-        ret['task'] = data
+        task=WHITESPACE_RE.sub(' ', data).strip(),
+        complexity=found.get('complexity'),
+        due_day=to_epoch_day(found['date']) if 'date' in found else None,
+        completed_date=found.get('completed_date'),
+        completed=found.get('completed'),
+        notification_at=notification_at,
+        duration=duration
+    )
+
+
+def normalize_path(filename, root=None):
+    """Приводит путь к абсолютному виду, относительные пути считаются от root (по умолчанию VAULT_PATH)"""
+    if not os.path.isabs(filename):
+        filename = os.path.join(root or VAULT_PATH, filename)
+    return os.path.abspath(filename)
+
+
+# Кандидаты в строки задач на уровне байтов. Между символами "- [ ]" допускаются
+# байты не из ASCII: при декодировании с errors='ignore' некорректные байты исчезают,
+# и такие строки тоже должны попасть в разбор.
+TASK_CANDIDATE_RE = re.compile(rb"-[\x80-\xff]* [\x80-\xff]*\[[\x80-\xff]*[ x][\x80-\xff]*\]")
 
-        return ret
-    return {}
 
+def iter_task_lines(data):
+    """
+    Находит в байтах файла строки-кандидаты в задачи и декодирует только их.
+    Строки делятся и возвращаются так же, как при чтении в текстовом режиме:
+    LF, CRLF и CR заменяются на "\n", у последней строки без перевода строки его нет.
+    Перевод строки важен: в "- [ ]\n" он служит текстом задачи, и такая строка - задача с пустым текстом.
+    """
+    has_cr = data.find(b'\r') != -1
+    size = len(data)
+    end = -1
+    for match in TASK_CANDIDATE_RE.finditer(data):
+        pos = match.start()
+        # Несколько кандидатов в одной строке
+        if pos < end:
+            continue
+
+        start = data.rfind(b'\n', 0, pos) + 1
+        end = data.find(b'\n', pos)
+        if end == -1:
+            end = size
+        if has_cr:
+            start = max(start, data.rfind(b'\r', 0, pos) + 1)
+            cr = data.find(b'\r', pos, end)
+            if cr != -1:
+                end = cr
+
+        line = data[start:end].decode('utf-8', 'ignore')
+        # Кандидат без байтов не из ASCII - это точно "- [ ]" или "- [x]"
+        if match.end() - pos == 5 or task_pattern_open in line or task_pattern_close in line:
+            yield line + '\n' if end < size else line
+
+
+def decode_task_lines(data):
+    """Декодирует файл целиком и отбирает строки задач (быстрее для файлов, где задач много)"""
+    text = data.decode('utf-8', 'ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    # Строки с переводом строки, как при чтении в текстовом режиме (см. iter_task_lines);
+    # splitlines не подходит: он делит и по другим разделителям (\x0b, \x85, \u2028)
+    lines = text.split('\n')
+    last = lines.pop()
+    task_lines = [line + '\n' for line in lines if task_pattern_open in line or task_pattern_close in line]
+    if task_pattern_open in last or task_pattern_close in last:
+        task_lines.append(last)
+    return task_lines
+
+
+def read_task_lines(filename, use_mmap=False):
+    """
+    Читает файл целиком и возвращает строки задач (с "\n", как в текстовом режиме).
+    С use_mmap большие файлы читаются через mmap. Если файл обрезают во время чтения
+    (редактор сохраняет с O_TRUNC), обращение к отображению завершает процесс сигналом SIGBUS,
+    который нельзя перехватить. Поэтому mmap используется только при сканировании хранилища,
+    а файлы из событий наблюдателя читаются через read().
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and PARSE_MMAP_THRESHOLD > 0 and size and size >= PARSE_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return list(iter_task_lines(data))
+        data = f.read()
 
-def parse_obsidian_file(filename):
-    """Парсит файл и возвращает список задач"""
+    # Разбор кандидата стоит как декодирование ~256 байт: при частых задачах
+    # дешевле декодировать весь файл, при редких - искать кандидаты по байтам
+    if data.count(b'- [') * 256 > len(data):
+        return decode_task_lines(data)
+    return list(iter_task_lines(data))
+
+
+def parse_obsidian_file_timed(filename, root=None, tz=None, use_mmap=False):
+    """
+    Парсит файл и возвращает (список задач, время разбора в секундах).
+    Время None, если файл не разбирался (не .md или уже удален).
+    """
     file_tasks = []
+    seconds = None
 
-    if not os.path.isabs(filename):
-        base_path = Path(VAULT_PATH)
-        filename = str(base_path / filename)
+    filename = sys.intern(normalize_path(filename, root))
 
     if filename.endswith(".md") and os.path.exists(filename):
+        started = time.perf_counter()
         try:
-            with open(filename, encoding="utf8", errors='ignore') as in_put:
-                for line in in_put:
-                    if task_pattern_open in line or task_pattern_close in line:
-                        task = parse_obsidian_task(line, filename)
-                        if task:
-                            file_tasks.append(task)
-            logger.info(f"Файл {filename} обработан, найдено задач: {len(file_tasks)}")
+            for line in read_task_lines(filename, use_mmap):
+                task = parse_obsidian_task(line, filename, tz)
+                if task:
+                    file_tasks.append(task)
+            logger.debug(f"Файл {filename} обработан, найдено задач: {len(file_tasks)}")
         except Exception as e:
             logger.error(f"Ошибка при чтении файла {filename}: {e}")
+        seconds = time.perf_counter() - started
+
+    return file_tasks, seconds
 
+
+def parse_obsidian_file(filename, root=None, tz=None, use_mmap=False):
+    """
+    Парсит файл и возвращает список задач (время напоминаний - в часовом поясе tz).
+    use_mmap - см. read_task_lines.
+    """
+    file_tasks, seconds = parse_obsidian_file_timed(filename, root, tz, use_mmap)
+    if seconds is not None:
+        FILE_PARSE_SECONDS.observe(seconds)
     return file_tasks
 
 
-def scan_all_files():
-    """Сканирует все файлы в VAULT_PATH и возвращает все задачи"""
-    global all_tasks
-    all_tasks = []
+def iter_markdown_files(root):
+    """
+    Обходит дерево каталогов через os.scandir и возвращает пути .md файлов.
+    Порядок обхода детерминирован: записи каталога сортируются по имени.
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.error(f"Ошибка при чтении каталога {path}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith('.md'):
+                    yield entry.path
+            except OSError:
+                continue
+
+        # Подкаталоги обходятся в алфавитном порядке
+        stack.extend(reversed(subdirs))
+
+
+def parse_file_batch(filenames, root=None, tz=None):
+    """
+    Парсит пачку файлов при сканировании хранилища (выполняется в процессе пула).
+    Возвращает пары (задачи, время разбора): метрики процессов пула не попадают
+    в /metrics, поэтому время записывает родитель в collect_parsed_batch.
+    """
+    return [parse_obsidian_file_timed(filename, root, tz, use_mmap=True) for filename in filenames]
+
+
+def collect_parsed_batch(results, batch_results):
+    """Добавляет задачи пачки в results и записывает время разбора файлов в FILE_PARSE_SECONDS"""
+    for file_tasks, seconds in batch_results:
+        if seconds is not None:
+            FILE_PARSE_SECONDS.observe(seconds)
+        results.append(file_tasks)
+
+
+def get_parse_pool(workers):
+    """Пул процессов парсинга, общий для всех хранилищ"""
+    global parse_pool
+
+    if parse_pool is None:
+        from concurrent.futures import ProcessPoolExecutor
+        # Процессы пула пишут логи напрямую: потока очереди логов в них нет
+        parse_pool = ProcessPoolExecutor(max_workers=workers, initializer=use_direct_handlers)
+    return parse_pool
 
-    logger.info(f"Начато сканирование всех файлов в {VAULT_PATH}...")
 
-    for root, dirs, files in os.walk(VAULT_PATH):
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, VAULT_PATH)
-                tasks = parse_obsidian_file(rel_path)
-                all_tasks.extend(tasks)
+def shutdown_parse_pool():
+    """Останавливает пул процессов парсинга после первоначального сканирования хранилищ"""
+    global parse_pool
+
+    if parse_pool is not None:
+        parse_pool.shutdown()
+        parse_pool = None
+
+
+def parse_files(filenames, root=None, tz=None):
+    """
+    Парсит список файлов последовательно или пулом процессов.
+    Результаты возвращаются в порядке входного списка.
+    Вместо сообщения на каждый файл периодически пишется общий прогресс.
+    """
+    workers = SCAN_WORKERS if SCAN_WORKERS > 0 else (os.cpu_count() or 1)
+    batch_size = max(1, SCAN_BATCH_SIZE)
+
+    results = []
+    if len(filenames) <= batch_size:
+        collect_parsed_batch(results, parse_file_batch(filenames, root, tz))
+        return results
 
-    logger.info(f"Сканирование завершено. Найдено задач: {len(all_tasks)}")
+    batches = [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+    progress = ProgressLog(logger, "Прочитано файлов", len(filenames), LOG_PROGRESS_SECONDS)
+
+    if workers <= 1:
+        for batch in batches:
+            collect_parsed_batch(results, parse_file_batch(batch, root, tz))
+            progress.advance(len(batch))
+        return results
+
+    logger.info(f"Параллельное сканирование: {len(filenames)} файлов, процессов: {workers}")
+    # map сохраняет порядок пачек, поэтому результат совпадает с последовательным
+    for batch, batch_results in zip(batches, get_parse_pool(workers).map(parse_file_batch, batches, repeat(root), repeat(tz))):
+        collect_parsed_batch(results, batch_results)
+        progress.advance(len(batch))
+    return results
+
+
+def scan_all_files(vault=None):
+    """Сканирует все файлы хранилища (по умолчанию - VAULT_PATH) и возвращает все задачи"""
+    vault = vault or default_vault
+    all_tasks = vault.tasks
+    timezone = vault.timezone
+    started = time.perf_counter()
+    all_tasks.clear()
+
+    cache = ParseCache(vault.parse_cache_path, vault.index_version(), timezone, use_hash=PARSE_CACHE_HASH)
+    cache.load()
+
+    logger.info(f"Начато сканирование всех файлов в {vault.path}...")
+
+    file_paths = [vault.normalize_path(path) for path in iter_markdown_files(vault.path)]
+    file_tasks = {}
+    to_parse = []
+
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logger.error(f"Ошибка при чтении файла {file_path}: {e}")
+            continue
+
+        cached = cache.get(file_path, stat)
+        if cached is None:
+            to_parse.append((file_path, stat))
+        else:
+            file_tasks[file_path] = cached
+
+    parsed = parse_files([file_path for file_path, _ in to_parse], vault.path, timezone)
+    for (file_path, stat), tasks in zip(to_parse, parsed):
+        # Задачи измененного файла сохраняют идентификаторы из прошлого запуска
+        match_tasks(cache.previous(file_path), tasks)
+        cache.put(file_path, stat, tasks)
+        file_tasks[file_path] = tasks
+
+    # Сливаем результаты в порядке обхода каталогов и публикуем одним снимком
+    all_tasks.replace_files(
+        (file_path, file_tasks[file_path]) for file_path in file_paths if file_path in file_tasks)
+
+    cache.save()
+    if vault.export is not None:
+        vault.export.sync()
+    SCAN_SECONDS.observe(time.perf_counter() - started)
+
+    logger.info(
+        f"Сканирование {vault.name} завершено. Найдено задач: {len(all_tasks)} "
+        f"(кэш: попаданий {cache.hits}, промахов {cache.misses})")
     return all_tasks
 
 
-def render_template(template_name: str, context: dict) -> str:
+def load_index(refresh=True, vault=None):
+    """
+    Готовит индекс задач для разовых команд CLI из кэша парсинга.
+    С refresh выполняется сканирование, в котором перечитываются только файлы с изменившимися
+    mtime или размером; без refresh кэш используется как есть. Если кэш пуст или отключен -
+    полное сканирование.
+    """
+    vault = vault or default_vault
+    if refresh:
+        return scan_all_files(vault)
+
+    cache = ParseCache(vault.parse_cache_path, vault.index_version(), vault.timezone)
+    cache.load()
+    if not cache:
+        return scan_all_files(vault)
+
+    all_tasks = vault.tasks
+    all_tasks.clear()
+    all_tasks.replace_files(cache.items())
+    logger.info(f"Индекс загружен из кэша {vault.parse_cache_path}, задач: {len(all_tasks)}")
+    return all_tasks
+
+
+def render_template(template_name: str, context: dict, templates_dir: str = TEMPLATES_DIR) -> str:
     """Рендерит шаблон с использованием Jinja2"""
     try:
-        template = get_template(template_name)
+        template = get_template(template_name, templates_dir)
         return template.render(context).strip()
     except Exception as e:
         logger.error(f"Ошибка при рендеринге шаблона {template_name}: {e}")
@@ -212,75 +700,181 @@ def render_template(template_name: str, context: dict) -> str:
         return f"Напоминание: {context.get('task', 'Неизвестная задача')}"
 
 
-async def send_telegram_notification(task):
-    """Отправляет уведомление в Telegram с использованием шаблона"""
-    if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == 'your_bot_token_here':
-        logger.warning("Telegram bot token не настроен")
-        return
+def observe_reminder_delivery(task, vault):
+    """Учитывает в метриках задержку доставки напоминания относительно плановой отправки"""
+    NOTIFICATIONS_SENT.inc('sent')
+    if task.notification_at is not None:
+        scheduled = task.notification_at - vault.schedule.lead_time
+        delay = (datetime.now(vault.timezone) - scheduled).total_seconds()
+        REMINDER_DELAY_SECONDS.observe(max(0.0, delay))
 
-    # Создаем контекст для шаблона
-    context = get_template_context(task=task)
 
-    # Рендерим сообщение из шаблона
-    message = render_template('notification', context)
+async def send_reminder_message(chat_id, message):
+    """
+    Отправляет напоминание с разметкой Markdown, при ошибке - обычным текстом.
+    Текст задач может содержать непарные "_" и "*": Telegram отклоняет такое сообщение,
+    и без повтора без разметки одна задача блокировала бы доставку всей части пакета.
+    """
+    if await telegram_client.send_message(chat_id, message):
+        return True
+    return await telegram_client.send_message(chat_id, message, parse_mode=None)
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
 
+async def send_telegram_notification(sent_key, task, vault):
+    """
+    Отправляет уведомление в чат хранилища с использованием его шаблона.
+    Задача помечается отправленной только после доставки,
+    недоставленная через NOTIFICATION_RETRY_SECONDS возвращается в расписание.
+    """
+    delivered = False
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    logger.info(f"Уведомление отправлено: {task['task']}")
-                else:
-                    logger.error(f"Ошибка отправки уведомления: {await response.text()}")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке в Telegram: {e}")
+        if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == 'your_bot_token_here':
+            logger.warning("Telegram bot token не настроен")
+            return
+
+        # Создаем контекст для шаблона
+        context = get_template_context(task=task.as_dict())
+
+        # Рендерим сообщение из шаблона
+        message = render_template('notification', context, vault.templates_dir)
+
+        delivered = await send_reminder_message(vault.chat_id, message)
+        if delivered:
+            vault.sent.add(sent_key, task)
+            observe_reminder_delivery(task, vault)
+            logger.info(f"Уведомление отправлено: {task.task}")
+        else:
+            NOTIFICATIONS_SENT.inc('error')
+            logger.error(f"Ошибка отправки уведомления: {task.task}")
+    finally:
+        vault.in_flight.discard(sent_key)
+        vault.sent.flush()
+
+    if not delivered:
+        import asyncio
+        await asyncio.sleep(NOTIFICATION_RETRY_SECONDS)
+        restore_notifications([task], vault)
+
+
+def split_batch(batch, max_length, templates_dir=TEMPLATES_DIR):
+    """
+    Делит пакет задач на части, каждая из которых рендерится в сообщение не длиннее max_length.
+    Возвращает список пар (задачи части, текст сообщения).
+    """
+    parts = []
+    current, current_message = [], None
+
+    for task in batch:
+        candidate = current + [task]
+        message = render_template(
+            'notification_batch', get_template_context(batch=[item.as_dict() for item in candidate]), templates_dir)
+        if len(message) <= max_length or not current:
+            current, current_message = candidate, message
+            continue
+
+        parts.append((current, current_message))
+        current = [task]
+        current_message = render_template(
+            'notification_batch', get_template_context(batch=[item.as_dict() for item in current]), templates_dir)
+
+    if current:
+        parts.append((current, current_message))
+
+    # Одна задача может не поместиться в лимит - обрезаем текст
+    return [(tasks, message[:max_length]) for tasks, message in parts]
+
+
+async def send_notification_batch(items, vault):
+    """
+    Отправляет несколько напоминаний одним сообщением (или несколькими при превышении лимита длины).
+    Задачи помечаются отправленными только после доставки их части пакета,
+    недоставленные через NOTIFICATION_RETRY_SECONDS возвращаются в расписание.
+    """
+    failed = []
+    try:
+        if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == 'your_bot_token_here':
+            logger.warning("Telegram bot token не настроен")
+            return
+
+        keys = {id(task): sent_key for sent_key, task in items}
+        batch = [task for _, task in items]
+
+        for tasks, message in split_batch(batch, TEMPLATE_CONFIG['message_max_length'], vault.templates_dir):
+            if await send_reminder_message(vault.chat_id, message):
+                for task in tasks:
+                    vault.sent.add(keys[id(task)], task)
+                for task in tasks:
+                    observe_reminder_delivery(task, vault)
+                logger.info(f"Пакет уведомлений отправлен: {len(tasks)} задач")
+            else:
+                NOTIFICATIONS_SENT.inc('error', amount=len(tasks))
+                logger.error(f"Ошибка отправки пакета уведомлений: {len(tasks)} задач")
+                failed.extend(tasks)
+    finally:
+        vault.in_flight.difference_update(sent_key for sent_key, _ in items)
+        vault.sent.flush()
+
+    if failed:
+        import asyncio
+        await asyncio.sleep(NOTIFICATION_RETRY_SECONDS)
+        restore_notifications(failed, vault)
+
+
+def restore_notifications(tasks, vault):
+    """
+    Возвращает недоставленные напоминания в расписание.
+    pop_due уже извлек их оттуда, поэтому без этого они не отправились бы повторно.
+    Берутся текущие версии задач: удаленные за время отправки не возвращаются.
+    """
+    ids = {task.id for task in tasks}
+    snapshot = vault.tasks.snapshot()
+    current = [
+        task for filename in {task.filename for task in tasks}
+        for task in snapshot.get_file(filename)
+        if task.id in ids
+    ]
+    # Напоминание могло быть отправлено заново, если файл изменился во время паузы
+    current = [task for task in current
+               if notification_key(task) not in vault.sent and notification_key(task) not in vault.in_flight]
+    vault.schedule.restore(current)
+    logger.info(f"Недоставленные напоминания возвращены в расписание: {len(current)} из {len(tasks)}")
 
 
-async def send_task_summary():
-    """Отправляет сводку по задачам"""
+async def send_task_summary(vault=None):
+    """Отправляет сводку по задачам хранилища в его чат"""
     if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == 'your_bot_token_here':
         logger.warning("Telegram bot token не настроен")
         return
 
+    vault = vault or default_vault
     # Получаем данные для сводки
-    summary_data = get_summary_data(all_tasks)
+    summary_data = get_summary_data(vault.stats, vault.timezone)
 
     # Создаем контекст для шаблона
     context = get_template_context(summary_data=summary_data)
 
     # Рендерим сообщение из шаблона
-    message = render_template('task_summary', context)
+    message = render_template('task_summary', context, vault.templates_dir)
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
+    if await telegram_client.send_message(vault.chat_id, message):
+        logger.info(f"Сводка по задачам {vault.name} отправлена")
+    else:
+        logger.error("Ошибка отправки сводки")
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    logger.info("Сводка по задачам отправлена")
-                else:
-                    logger.error(f"Ошибка отправки сводки: {await response.text()}")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке сводки в Telegram: {e}")
 
+async def send_task_summaries(selected):
+    """Отправляет сводки выбранных хранилищ, каждую в чат своего хранилища"""
+    for vault in selected:
+        await send_task_summary(vault)
 
-async def send_error_notification(error_message: str, filename: str = None):
+
+async def send_error_notification(error_message: str, filename: str = None, vault=None):
     """Отправляет уведомление об ошибке"""
     if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == 'your_bot_token_here':
         logger.warning("Telegram bot token не настроен")
         return
 
+    vault = vault or default_vault
     error_data = {
         'error_type': 'Ошибка обработки файла',
         'error_message': error_message,
@@ -288,164 +882,474 @@ async def send_error_notification(error_message: str, filename: str = None):
     }
 
     context = get_template_context(error_data=error_data)
-    message = render_template('error_notification', context)
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
+    message = render_template('error_notification', context, vault.templates_dir)
 
+    if await telegram_client.send_message(vault.chat_id, message):
+        logger.info("Уведомление об ошибке отправлено")
+    else:
+        logger.error("Ошибка отправки уведомления об ошибке")
+
+
+def render_search_results(vault, title, total, tasks):
+    """Ответ на команду бота; при нескольких хранилищах в заголовке указывается имя хранилища"""
+    if len(vaults) > 1:
+        title = f"{vault.name}: {title}"
+    context = get_template_context(search_data={
+        'title': title,
+        'total': total,
+        'tasks': [task.as_dict() for task in tasks]
+    })
+    message = render_template('search_results', context, vault.templates_dir)
+    return message[:TEMPLATE_CONFIG['message_max_length']]
+
+
+def chat_vaults(chat_id):
+    return [vault for vault in vaults if str(vault.chat_id) == chat_id]
+
+
+def bot_find(chat_id, query):
+    """/find слова - задачи, текст которых содержит все слова запроса"""
+    if not query:
+        return ["Укажите слова для поиска: /find счет"]
+    replies = []
+    for vault in chat_vaults(chat_id):
+        total, tasks = vault.text_index.search(query, BOT_RESULTS_LIMIT)
+        replies.append(render_search_results(vault, f"Поиск: {query}", total, tasks))
+    return replies
+
+
+def bot_today(chat_id, args):
+    """/today - незавершенные задачи с датой выполнения или напоминанием на сегодня"""
+    replies = []
+    for vault in chat_vaults(chat_id):
+        today = datetime.now(vault.timezone).date()
+        day = to_epoch_day(today.isoformat())
+        day_start = vault.timezone.localize(datetime.combine(today, datetime.min.time()))
+        day_end = vault.timezone.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+
+        # Оба запроса перебирают только задачи сегодняшнего дня в упорядоченных индексах
+        _, _, due = vault.index.query(status='TODO', due_from=day, due_to=day, limit=sys.maxsize)
+        _, _, reminders = vault.index.query(
+            status='TODO', remind_from=day_start.timestamp(), remind_to=day_end.timestamp() - 1,
+            limit=sys.maxsize)
+        tasks = sorted({task.id: task for task in due + reminders}.values(), key=search_sort_key)
+        replies.append(render_search_results(vault, "Сегодня", len(tasks), tasks[:BOT_RESULTS_LIMIT]))
+    return replies
+
+
+def bot_help(chat_id, args):
+    return ["/find слова - поиск задач по тексту\n/today - задачи и напоминания на сегодня"]
+
+
+async def run_once(coro):
+    """Выполняет разовую корутину и закрывает соединения с Telegram"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    logger.info("Уведомление об ошибке отправлено")
-                else:
-                    logger.error(f"Ошибка отправки уведомления об ошибке: {await response.text()}")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке уведомления об ошибке: {e}")
+        return await coro
+    finally:
+        await telegram_client.close()
 
 
-def check_notifications():
-    """Проверяет задачи и отправляет уведомления за 5 минут до времени"""
-    global all_tasks, notification_sent
+def spawn_send(coro):
+    """Запускает отправку в фоне"""
+    import asyncio
+    send = asyncio.create_task(coro)
+    pending_sends.add(send)
+    send.add_done_callback(pending_sends.discard)
 
-    now = datetime.now(timezone)
-    notifications_found = 0
 
-    for task in all_tasks:
-        if task['status'] != 'TODO':
-            continue
+async def check_notifications():
+    """
+    Проверяет задачи всех хранилищ и ставит в очередь уведомления за 5 минут до времени.
+    Отправка идет в фоне, медленный ответ Telegram не задерживает остальные напоминания.
+    """
+    for vault in vaults:
+        check_vault_notifications(vault)
 
-        notification = task.get('notification')
-        if not notification:
-            continue
 
-        # Создаем уникальный идентификатор для задачи
-        task_id = f"{task['filename']}:{task['raw_line']}"
+def check_vault_notifications(vault):
+    now = datetime.now(vault.timezone)
 
-        if task_id in notification_sent:
-            continue
+    # Расписание отдает только задачи, время которых наступает в течение 5 минут
+    due = [
+        (sent_key, task) for sent_key, task in vault.schedule.pop_due(now)
+        if sent_key not in vault.sent and sent_key not in vault.in_flight
+    ]
+    notifications_found = len(due)
 
-        try:
-            # Парсим время уведомления
-            notification_time = datetime.strptime(notification, '%Y-%m-%d %H:%M')
-            notification_time = timezone.localize(notification_time)
+    if NOTIFICATION_BATCHING and len(due) > 1:
+        logger.info(f"Время уведомления! Задач в пакете: {len(due)}")
+        vault.in_flight.update(sent_key for sent_key, _ in due)
+        spawn_send(send_notification_batch(due, vault))
+    else:
+        for sent_key, task in due:
+            logger.info(f"Время уведомления! Задача: {task.task}")
+            vault.in_flight.add(sent_key)
+            spawn_send(send_telegram_notification(sent_key, task, vault))
 
-            # Проверяем, наступает ли время уведомления в течение 5 минут
-            time_diff = notification_time - now
-            if timedelta(seconds=0) <= time_diff <= timedelta(minutes=5):
-                logger.info(f"Время уведомления! Задача: {task['task']}")
-                asyncio.run(send_telegram_notification(task))
-                notification_sent.add(task_id)
-                notifications_found += 1
+    if notifications_found > 0:
+        logger.info(f"Обработано уведомлений {vault.name}: {notifications_found}")
 
-        except ValueError as e:
-            logger.error(f"Ошибка парсинга времени: {notification}, ошибка: {e}")
+    vault.sent.flush()
+    vault.sent.prune(now.timestamp())
 
-    if notifications_found > 0:
-        logger.info(f"Обработано уведомлений: {notifications_found}")
 
+class SyncHandler:
+    """
+    Обработчик событий watchdog. Наблюдатель вызывает у обработчика только dispatch(),
+    поэтому наследование от FileSystemEventHandler не нужно и watchdog
+    не импортируется разовыми командами CLI.
+    Поток наблюдателя только ставит события в очередь, файлы парсятся в потоке debouncer,
+    а новые задачи публикуются снимком TaskStore.
+    """
+
+    def __init__(self, vault, debounce_seconds=0):
+        self.vault = vault
+        self.source_dir = vault.path
+        # События одного файла склеиваются, файл парсится один раз на серию записей
+        self.debouncer = EventDebouncer(debounce_seconds, self.process_event, name=f"file-events-{vault.name}")
+
+    def dispatch(self, event):
+        handler = getattr(self, f"on_{event.event_type}", None)
+        if handler is not None:
+            handler(event)
+
+    def process_event(self, src_path, action):
+        if action == 'delete':
+            self.remove_file_tasks(src_path)
+        else:
+            self.update_file_tasks(src_path)
 
-class SyncHandler(FileSystemEventHandler):
-    def __init__(self, source_dir):
-        self.source_dir = source_dir
+    def queue_event(self, src_path, action):
+        if src_path.endswith('.md'):
+            self.debouncer.push(src_path, action)
 
     def update_file_tasks(self, src_path):
         """Обновляет все задачи из указанного файла"""
         if not os.path.exists(src_path):
-            logger.warning(f"Файл не существует: {src_path}")
+            event_log.log(logger, logging.WARNING, 'missing', f"Файл не существует: {src_path}")
             return
 
-        # Определяем относительный путь
-        # rel_path = os.path.relpath(src_path, self.source_dir)
-        rel_path = src_path
-        logger.info(f"Обновление задач из файла: {rel_path}")
+        # Ключ хранилища - абсолютный путь к файлу
+        file_path = self.vault.normalize_path(src_path)
 
         # Парсим файл и получаем актуальные задачи
-        new_tasks = parse_obsidian_file(rel_path)
+        new_tasks = parse_obsidian_file(file_path, self.vault.path, self.vault.timezone)
 
-        # Обновляем global all_tasks
-        global all_tasks
+        # Заменяем старые задачи этого файла новыми, подписчики получают только разницу
+        events = self.vault.tasks.replace_file(file_path, new_tasks)
+        counts = Counter(event.kind for event in events)
+        for kind, count in counts.items():
+            TASK_EVENTS.inc(kind, amount=count)
 
-        # Удаляем все старые задачи из этого файла
-        initial_count = len(all_tasks)
-        all_tasks = [task for task in all_tasks if task.get('filename') != rel_path]
-        removed_count = initial_count - len(all_tasks)
-
-        # Добавляем новые задачи
-        all_tasks.extend(new_tasks)
-
-        logger.info(
-            f"Обновление завершено: удалено {removed_count} задач, добавлено {len(new_tasks)} задач. Всего задач: {len(all_tasks)}")
+        # Одно сообщение на обновление файла, при массовых правках - прореженное
+        event_log.log(
+            logger, logging.INFO, 'update',
+            f"Обновлен файл {file_path}: добавлено {counts['added']}, удалено {counts['removed']}, "
+            f"изменено {len(events) - counts['added'] - counts['removed']} задач. Всего задач: {len(self.vault.tasks)}")
 
     def on_created(self, event):
         if not event.is_directory:
+            FS_EVENTS.inc('created')
             logger.debug(f"Создан файл: {event.src_path}")
-            self.update_file_tasks(event.src_path)
+            self.queue_event(event.src_path, 'update')
 
     def on_modified(self, event):
         if not event.is_directory:
+            FS_EVENTS.inc('modified')
             logger.debug(f"Изменен файл: {event.src_path}")
-            self.update_file_tasks(event.src_path)
+            self.queue_event(event.src_path, 'update')
+
+    def remove_file_tasks(self, src_path):
+        """Удаляет все задачи указанного файла"""
+        file_path = self.vault.normalize_path(src_path)
+        events = self.vault.tasks.remove_file(file_path)
+        if events:
+            TASK_EVENTS.inc('removed', amount=len(events))
+        event_log.log(logger, logging.INFO, 'remove', f"Удалено {len(events)} задач из файла: {file_path}")
 
     def on_moved(self, event):
         if not event.is_directory:
+            FS_EVENTS.inc('moved')
             logger.debug(f"Перемещен файл: {event.src_path} -> {event.dest_path}")
-            self.update_file_tasks(event.dest_path)
+            self.queue_event(event.src_path, 'delete')
+            self.queue_event(event.dest_path, 'update')
 
     def on_deleted(self, event):
         if not event.is_directory:
+            FS_EVENTS.inc('deleted')
             logger.debug(f"Удален файл: {event.src_path}")
-            # Удаляем задачи из удаленного файла
-            global all_tasks
-            rel_path = os.path.relpath(event.src_path, self.source_dir)
-            initial_count = len(all_tasks)
-            all_tasks = [task for task in all_tasks if task.get('filename') != rel_path]
-            removed_count = initial_count - len(all_tasks)
-            logger.info(f"Удалено {removed_count} задач из файла: {rel_path}")
+            self.queue_event(event.src_path, 'delete')
 
 
-def start_sync_monitoring(source_dir):
-    """Запуск мониторинга для автоматической синхронизации"""
+def start_observer(handlers):
+    """
+    Запускает один наблюдатель за каталогами всех хранилищ согласно OBSERVER_BACKEND.
+    В режиме auto используется нативный бэкенд (inotify), а при ошибке - опрос.
+    На сетевых ФС inotify не присылает событий, для них нужно явно указать polling.
+    """
+    from watchdog.observers import Observer
+    from polling import AdaptivePollingObserver
+
+    if OBSERVER_BACKEND in ('auto', 'native'):
+        observer = Observer()
+        try:
+            for handler in handlers:
+                observer.schedule(handler, handler.source_dir, recursive=True)
+            observer.start()
+            logger.info(f"Используется нативный наблюдатель: {type(observer).__name__}")
+            return observer
+        except Exception as e:
+            # start() останавливает только не запустившийся emitter: уже запущенные
+            # наполняли бы очередь, которую никто не читает, а каталоги наблюдались бы дважды
+            try:
+                observer.stop()
+            except Exception as stop_error:
+                logger.debug(f"Ошибка остановки нативного наблюдателя: {stop_error}")
+            if OBSERVER_BACKEND == 'native':
+                raise
+            logger.warning(f"Нативный наблюдатель недоступен ({e}), используется опрос файлов")
+
+    observer = AdaptivePollingObserver(
+        min_interval=POLL_MIN_INTERVAL,
+        max_interval=POLL_MAX_INTERVAL,
+        check_files_every=POLL_CHECK_FILES_EVERY
+    )
+    for handler in handlers:
+        observer.schedule(handler, handler.source_dir, recursive=True)
+    observer.start()
+    logger.info(f"Используется наблюдатель с опросом файлов (интервал {POLL_MIN_INTERVAL}-{POLL_MAX_INTERVAL} с)")
+    return observer
+
+
+async def monitor_notifications():
+    """Основной цикл: проверяет уведомления и спит до ближайшего из них"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    api_runner = None
+    if API_PORT:
+        api_runner = await start_query_api(
+            {vault.name: (vault.index, vault.timezone, vault.normalize_path) for vault in vaults},
+            API_HOST, API_PORT)
+
+    bot_task = None
+    if TELEGRAM_BOT_COMMANDS:
+        from telegram_bot import CommandBot
+        bot = CommandBot(
+            telegram_client,
+            {'find': bot_find, 'today': bot_today, 'start': bot_help, 'help': bot_help},
+            [vault.chat_id for vault in vaults],
+            poll_timeout=BOT_POLL_TIMEOUT)
+        bot_task = asyncio.create_task(bot.run())
+
+    schedules = [vault.schedule for vault in vaults]
+    try:
+        while True:
+            await check_notifications()
+            # Ожидание на общем условии расписаний выполняется в потоке, чтобы не блокировать цикл событий
+            await loop.run_in_executor(None, wait_any, schedules, NOTIFICATION_MAX_SLEEP)
+    finally:
+        default_vault.schedule.wake()
+        if bot_task is not None:
+            bot_task.cancel()
+        await telegram_client.close()
+        for vault in vaults:
+            vault.sent.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if api_runner is not None:
+            await api_runner.cleanup()
+
+
+def start_sync_monitoring():
+    """Запуск мониторинга всех хранилищ для автоматической синхронизации"""
 
     # Первоначальное сканирование всех файлов
-    scan_all_files()
+    try:
+        for vault in vaults:
+            scan_all_files(vault)
+            # Отметки об отправке загружаются после индекса, чтобы сопоставить их с задачами
+            vault.sent.load(vault.tasks)
+    finally:
+        # Дальше файлы парсятся по одному в потоке обработчика событий
+        shutdown_parse_pool()
 
     # Запуск мониторинга
-    event_handler = SyncHandler(source_dir)
-    observer = PollingObserver()
-    observer.schedule(event_handler, source_dir, recursive=True)
-
-    observer.start()
-    logger.info(f"Мониторинг запущен: {source_dir}")
-    logger.info(f"Всего задач: {len(all_tasks)}")
-
+    handlers = [SyncHandler(vault, debounce_seconds=EVENT_DEBOUNCE_SECONDS) for vault in vaults]
+    for handler in handlers:
+        handler.debouncer.start()
+    Gauge('obsidian_queued_file_events', 'File events waiting in the debounce queue.',
+          fn=lambda: sum(len(handler.debouncer) for handler in handlers))
+    observer = start_observer(handlers)
+    for vault in vaults:
+        logger.info(f"Мониторинг запущен: {vault.name} ({vault.path}), всего задач: {len(vault.tasks)}")
+
+    import asyncio
     try:
-        while True:
-            # Проверяем уведомления каждые 30 секунд
-            check_notifications()
-            time.sleep(30)
+        asyncio.run(monitor_notifications())
 
     except KeyboardInterrupt:
         observer.stop()
         logger.info("Мониторинг остановлен по запросу пользователя")
 
     observer.join()
+    for handler in handlers:
+        handler.debouncer.stop()
+
+
+def format_task_line(task, vault):
+    """Строка задачи для вывода в консоль (с именем хранилища, если их несколько)"""
+    columns = [
+        task.status,
+        task.date or '-',
+        task.notification or '-',
+        os.path.relpath(task.filename, vault.path),
+        task.task
+    ]
+    if len(vaults) > 1:
+        columns.insert(0, vault.name)
+    return "\t".join(columns)
 
 
-if __name__ == "__main__":
-    # Для тестирования можно запустить сканирование без мониторинга
-    if len(os.sys.argv) > 1:
-        if os.sys.argv[1] == 'scan':
-            logger.info("Запуск сканирования...")
-            scan_all_files()
-            logger.info("Сканирование завершено")
-        elif os.sys.argv[1] == 'summary':
-            logger.info("Отправка сводки...")
-            asyncio.run(send_task_summary())
-            logger.info("Сводка отправлена")
+def task_sort_key(task):
+    return (
+        task.due_day if task.due_day is not None else float('inf'),
+        task.notification or '',
+        task.filename
+    )
+
+
+def list_tasks(status='TODO', filename=None, vault=None):
+    """Задачи индекса с фильтром по статусу и файлу"""
+    vault = vault or default_vault
+    file_path = vault.normalize_path(filename) if filename else None
+    snapshot = vault.tasks.snapshot()
+    tasks = snapshot.get_file(file_path) if file_path else snapshot
+    return sorted(
+        (task for task in tasks if status == 'all' or task.status == status),
+        key=task_sort_key
+    )
+
+
+def due_tasks(hours=24, vault=None):
+    """
+    Незавершенные задачи, требующие внимания: напоминания в ближайшие hours часов
+    и задачи с датой выполнения (📅) на сегодня или раньше.
+    """
+    vault = vault or default_vault
+    now = datetime.now(vault.timezone)
+    today = to_epoch_day(now.date().isoformat())
+
+    tasks = {task.id: task for task in vault.stats.upcoming(now, now + timedelta(hours=hours))}
+    for task in vault.tasks.snapshot():
+        if task.status == 'TODO' and task.due_day is not None and task.due_day <= today:
+            tasks[task.id] = task
+    return sorted(tasks.values(), key=task_sort_key)
+
+
+def format_history_line(stats, vault):
+    """Строка помесячной статистики из колоночной выгрузки"""
+    rate = f"{stats['due_done'] * 100 // stats['due']}%" if stats['due'] else '-'
+    columns = [
+        stats['month'],
+        f"{stats['due_done']}/{stats['due']}",
+        rate,
+        str(stats['completed']),
+        str(stats['duration']),
+        '/'.join(str(count) for count in reversed(stats['complexity'][1:])) + f"/{stats['complexity'][0]}"
+    ]
+    if len(vaults) > 1:
+        columns.insert(0, vault.name)
+    return "\t".join(columns)
+
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(description='Мониторинг задач Obsidian с напоминаниями в Telegram')
+    parser.set_defaults(vault=None)
+    subparsers = parser.add_subparsers(dest='command')
+
+    vault_parser = argparse.ArgumentParser(add_help=False)
+    vault_parser.add_argument('--vault', help='Только хранилище с этим именем (по умолчанию - все)')
+
+    subparsers.add_parser('scan', parents=[vault_parser], help='Просканировать хранилища и обновить кэш парсинга')
+
+    refresh_parser = argparse.ArgumentParser(add_help=False, parents=[vault_parser])
+    refresh_parser.add_argument(
+        '--no-refresh', dest='refresh', action='store_false',
+        help='Использовать кэш парсинга без проверки изменений файлов')
+
+    subparsers.add_parser('summary', parents=[refresh_parser], help='Отправить сводку по задачам')
+
+    list_parser = subparsers.add_parser('list', parents=[refresh_parser], help='Вывести задачи')
+    list_parser.add_argument('--status', default='TODO', choices=['TODO', 'DONE', 'all'])
+    list_parser.add_argument('--file', help='Только задачи файла (путь относительно каталога хранилища)')
+
+    due_parser = subparsers.add_parser(
+        'due', parents=[refresh_parser], help='Вывести ближайшие напоминания и просроченные задачи')
+    due_parser.add_argument('--hours', type=float, default=24, help='Окно напоминаний, часов')
+
+    subparsers.add_parser(
+        'history', parents=[refresh_parser],
+        help='Помесячная статистика выполнения из колоночной выгрузки (TASK_EXPORT_PATH)')
+
+    args = parser.parse_args(argv)
+
+    selected = [vault for vault in vaults if args.vault in (None, vault.name)]
+    if not selected:
+        parser.error(f"неизвестное хранилище: {args.vault}")
+
+    if args.command is None:
+        setup_logging()
+        start_sync_monitoring()
+    elif args.command == 'scan':
+        setup_logging()
+        logger.info("Запуск сканирования...")
+        try:
+            for vault in selected:
+                scan_all_files(vault)
+        finally:
+            shutdown_parse_pool()
+        logger.info("Сканирование завершено")
+    elif args.command == 'summary':
+        setup_logging(log_file=False)
+        for vault in selected:
+            load_index(args.refresh, vault)
+        logger.info("Отправка сводки...")
+        import asyncio
+        asyncio.run(run_once(send_task_summaries(selected)))
+        logger.info("Сводка отправлена")
+    elif args.command == 'history':
+        if any(vault.export is None for vault in selected):
+            parser.error("колоночная выгрузка отключена, задайте TASK_EXPORT_PATH")
+        setup_logging(level=logging.WARNING, log_file=False)
+        # Месяц, выполнено из задач с датой в месяце, доля, выполнено за месяц, минут, по сложности 🟥/🟨/🟩/без
+        for vault in selected:
+            # Обновление индекса дописывает в выгрузку измененные файлы
+            load_index(args.refresh, vault)
+            if not os.path.exists(vault.export.path):
+                continue
+            for stats in monthly_stats(load_columns(vault.export.path)):
+                print(format_history_line(stats, vault))
+        shutdown_parse_pool()
     else:
-        start_sync_monitoring(VAULT_PATH)
\ No newline at end of file
+        # Вывод команды - данные, в консоль попадают только предупреждения и ошибки
+        setup_logging(level=logging.WARNING, log_file=False)
+        rows = []
+        for vault in selected:
+            load_index(args.refresh, vault)
+            if args.command == 'list':
+                tasks = list_tasks(args.status, args.file, vault)
+            else:
+                tasks = due_tasks(args.hours, vault)
+            rows.extend((task, vault) for task in tasks)
+        # Задачи разных хранилищ выводятся вперемешку, в общем порядке сроков
+        rows.sort(key=lambda row: task_sort_key(row[0]))
+        for task, vault in rows:
+            print(format_task_line(task, vault))
+        shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    run_cli(sys.argv[1:])
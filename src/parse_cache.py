@@ -0,0 +1,139 @@
+"""
+Кэш результатов парсинга файлов на диске
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+
+from task_record import Task, parse_notification_time
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(filename):
+    """Считает хэш содержимого файла"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def task_to_row(task):
+    return (task.status, task.raw_line, task.task, task.complexity, task.due_day, task.completed_date,
+            task.completed, task.notification, task.duration, task.id)
+
+
+def row_to_task(row, filename, timezone):
+    status, raw_line, text, complexity, due_day, completed_date, completed, notification, duration, task_id = row
+    return Task(status, filename, raw_line, text, complexity, due_day, completed_date, completed,
+                parse_notification_time(notification, timezone), duration, task_id)
+
+
+class ParseCache:
+    """
+    Хранит распарсенные задачи по файлам с ключом (путь, mtime, размер).
+    При несовпадении версии весь кэш считается недействительным.
+    Если включен use_hash, файл с измененным mtime, но тем же содержимым,
+    тоже считается попаданием.
+    Задачи хранятся кортежами в pickle: кэш служит и индексом для разовых команд CLI,
+    поэтому загружается быстрее, чем словари задач в JSON.
+    """
+
+    def __init__(self, path, version, timezone, use_hash=False):
+        self.path = path
+        self.version = version
+        self.timezone = timezone
+        self.use_hash = use_hash
+        # filename -> [mtime_ns, размер, хэш или None, строки задач]
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._seen = set()
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """Загружает кэш с диска, при ошибке или смене версии начинает с пустого"""
+        self.entries = {}
+        self._dirty = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш {self.path}: {e}")
+            return
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            logger.info(f"Версия кэша изменилась, кэш {self.path} сброшен")
+            return
+        self.entries = data.get('files', {})
+        self._dirty = False
+
+    def save(self):
+        """Сохраняет кэш на диск; записи файлов, не встреченных при сканировании, удаляются"""
+        if not self.path:
+            return
+        entries = {name: entry for name, entry in self.entries.items() if name in self._seen}
+        # Кэш не изменился - перезапись не нужна
+        if not self._dirty and len(entries) == len(self.entries):
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': self.version, 'files': entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить кэш {self.path}: {e}")
+
+    def _tasks(self, filename, entry):
+        return [row_to_task(row, filename, self.timezone) for row in entry[3]]
+
+    def get(self, filename, stat):
+        """Возвращает задачи файла из кэша или None, если файл нужно перечитать"""
+        self._seen.add(filename)
+        entry = self.entries.get(filename)
+        if entry is not None:
+            if entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self.hits += 1
+                return self._tasks(filename, entry)
+            if self.use_hash and entry[2] and entry[1] == stat.st_size:
+                try:
+                    if file_hash(filename) == entry[2]:
+                        entry[0] = stat.st_mtime_ns
+                        self._dirty = True
+                        self.hits += 1
+                        return self._tasks(filename, entry)
+                except OSError:
+                    pass
+        self.misses += 1
+        return None
+
+    def previous(self, filename):
+        """Задачи из устаревшей записи файла (для переноса идентификаторов задач)"""
+        entry = self.entries.get(filename)
+        return self._tasks(filename, entry) if entry is not None else []
+
+    def items(self):
+        """Все файлы кэша с задачами без проверки изменений (для команд CLI с --no-refresh)"""
+        for filename, entry in self.entries.items():
+            yield filename, self._tasks(filename, entry)
+
+    def put(self, filename, stat, tasks):
+        file_digest = None
+        if self.use_hash:
+            try:
+                file_digest = file_hash(filename)
+            except OSError:
+                pass
+        self._seen.add(filename)
+        self.entries[filename] = [stat.st_mtime_ns, stat.st_size, file_digest, [task_to_row(task) for task in tasks]]
+        self._dirty = True
@@ -0,0 +1,171 @@
+"""
+Опрос хранилища для файловых систем без inotify (сетевые и примонтированные каталоги)
+"""
+
+import logging
+import os
+import time
+from functools import partial
+
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent
+from watchdog.observers.api import BaseObserver, EventEmitter
+
+logger = logging.getLogger(__name__)
+
+# Каталог, измененный в последние секунды, перечитывается и на следующем проходе:
+# на сетевых ФС mtime каталога бывает грубым, и второе изменение в ту же секунду его не меняет
+UNSTABLE_SECONDS = 2.0
+
+
+class MarkdownTree:
+    """
+    Снимок дерева каталогов: mtime каждого каталога, его подкаталоги и .md файлы с (mtime, размер).
+    Каталог перечитывается только при изменении его mtime (создание, удаление и переименование файлов),
+    остальные файлы, кроме .md, не проверяются вовсе.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # каталог -> [mtime_ns, имена подкаталогов, имена .md файлов, нужно ли перечитать]
+        self._dirs = {}
+        # путь .md файла -> (mtime_ns, размер)
+        self._files = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def poll(self, check_files=True):
+        """
+        Обходит известные каталоги и возвращает события изменений с прошлого прохода.
+        С check_files проверяются и .md файлы неизмененных каталогов (правка файла на месте
+        не меняет mtime каталога).
+        """
+        events = []
+        self._poll_dir(self.root, check_files, events)
+        return events
+
+    def _poll_dir(self, path, check_files, events):
+        entry = self._dirs.get(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            if entry is not None:
+                self._forget_dir(path, events)
+            return
+
+        if entry is None or entry[0] != mtime or entry[3]:
+            entry = self._list_dir(path, entry, mtime, events)
+            if entry is None:
+                return
+        elif check_files:
+            for name in entry[2]:
+                self._check_file(os.path.join(path, name), events)
+
+        for name in entry[1]:
+            self._poll_dir(os.path.join(path, name), check_files, events)
+
+    def _list_dir(self, path, entry, mtime, events):
+        subdirs, files = set(), set()
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.add(item.name)
+                        elif item.name.endswith('.md'):
+                            files.add(item.name)
+                    except OSError:
+                        continue
+        except OSError:
+            if entry is not None:
+                self._forget_dir(path, events)
+            return None
+
+        old_subdirs, old_files = (entry[1], entry[2]) if entry is not None else (set(), set())
+        for name in old_files - files:
+            file_path = os.path.join(path, name)
+            if self._files.pop(file_path, None) is not None:
+                events.append(FileDeletedEvent(file_path))
+        for name in old_subdirs - subdirs:
+            self._forget_dir(os.path.join(path, name), events)
+        for name in files:
+            self._check_file(os.path.join(path, name), events)
+
+        unstable = time.time() - mtime / 1e9 < UNSTABLE_SECONDS
+        entry = self._dirs[path] = [mtime, subdirs, files, unstable]
+        return entry
+
+    def _check_file(self, file_path, events):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # Удаление заметит перечитывание каталога
+            return
+        state = (stat.st_mtime_ns, stat.st_size)
+        previous = self._files.get(file_path)
+        if previous != state:
+            self._files[file_path] = state
+            events.append(FileCreatedEvent(file_path) if previous is None else FileModifiedEvent(file_path))
+
+    def _forget_dir(self, path, events):
+        """Каталог исчез: все его .md файлы (и файлы подкаталогов) считаются удаленными"""
+        entry = self._dirs.pop(path, None)
+        if entry is None:
+            return
+        for name in entry[2]:
+            file_path = os.path.join(path, name)
+            if self._files.pop(file_path, None) is not None:
+                events.append(FileDeletedEvent(file_path))
+        for name in entry[1]:
+            self._forget_dir(os.path.join(path, name), events)
+
+
+class AdaptivePollingEmitter(EventEmitter):
+    """
+    Источник событий watchdog на основе MarkdownTree.
+    Интервал опроса сокращается до min_interval после найденных изменений
+    и растет в backoff раз на каждом проходе без изменений, до max_interval.
+    """
+
+    def __init__(self, event_queue, watch, timeout=1.0, event_filter=None,
+                 min_interval=1.0, max_interval=30.0, backoff=1.5, check_files_every=1):
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.check_files_every = max(1, check_files_every)
+        self.interval = min_interval
+        self._tree = MarkdownTree(watch.path)
+        self._passes = 0
+
+    def on_thread_start(self):
+        # Первый проход только запоминает состояние, хранилище уже просканировано
+        started = time.perf_counter()
+        self._tree.poll()
+        logger.info(
+            f"Опрос {self.watch.path}: файлов .md {len(self._tree)}, "
+            f"первый проход {time.perf_counter() - started:.2f} с")
+
+    def queue_events(self, timeout):
+        if self.stopped_event.wait(self.interval):
+            return
+
+        self._passes += 1
+        events = self._tree.poll(check_files=self._passes % self.check_files_every == 0)
+        for event in events:
+            self.queue_event(event)
+
+        if events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+
+class AdaptivePollingObserver(BaseObserver):
+    """Наблюдатель с опросом, который перечитывает только измененные каталоги и проверяет только .md файлы"""
+
+    def __init__(self, min_interval=1.0, max_interval=30.0, check_files_every=1):
+        emitter_class = partial(
+            AdaptivePollingEmitter, min_interval=min_interval, max_interval=max_interval,
+            check_files_every=check_files_every)
+        super().__init__(emitter_class, timeout=min_interval)
@@ -0,0 +1,145 @@
+"""
+HTTP/JSON API только для чтения поверх индекса задач
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from task_record import parse_notification_time, to_epoch_day
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 1000
+# Сколько задач сериализуется в один фрагмент потокового ответа
+STREAM_CHUNK_SIZE = 200
+
+
+def task_to_json(task):
+    data = task.as_dict()
+    # 64-битный id в JSON теряет точность в JavaScript
+    if 'id' in data:
+        data['id'] = str(data['id'])
+    return data
+
+
+def parse_query(params, timezone, normalize_path=None):
+    """
+    Разбирает параметры запроса /tasks в аргументы TaskIndex.query.
+    При некорректном значении выбрасывает ValueError.
+    """
+    def get_day(name):
+        value = params.get(name)
+        if value is None:
+            return None
+        day = to_epoch_day(value)
+        if day is None:
+            raise ValueError(f"{name}: ожидается дата ГГГГ-ММ-ДД")
+        return day
+
+    def get_time(name):
+        value = params.get(name)
+        if value is None:
+            return None
+        moment = parse_notification_time(value, timezone)
+        if moment is None:
+            raise ValueError(f"{name}: ожидается время ГГГГ-ММ-ДД ЧЧ:ММ")
+        return moment.timestamp()
+
+    def get_int(name, default=None):
+        value = params.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{name}: ожидается целое число")
+
+    query = {
+        'status': params.get('status'),
+        'complexity': get_int('complexity'),
+        'filename': params.get('file'),
+        'due_from': get_day('due_from'),
+        'due_to': get_day('due_to'),
+        'remind_from': get_time('remind_from'),
+        'remind_to': get_time('remind_to'),
+        'offset': max(0, get_int('offset', 0)),
+        'limit': min(MAX_PAGE_SIZE, max(1, get_int('limit', 100)))
+    }
+
+    if query['filename'] is not None and normalize_path is not None:
+        query['filename'] = normalize_path(query['filename'])
+
+    # Просроченные: незавершенные задачи с датой выполнения раньше сегодняшней
+    if params.get('overdue', '').lower() in ('1', 'true', 'yes'):
+        today = to_epoch_day(datetime.now(timezone).date().isoformat())
+        query['status'] = 'TODO'
+        due_to = today - 1
+        query['due_to'] = due_to if query['due_to'] is None else min(query['due_to'], due_to)
+
+    return query
+
+
+async def start_query_api(vaults, host, port):
+    """
+    Запускает API в текущем цикле событий, возвращает runner для остановки.
+    vaults - словарь: имя хранилища -> (TaskIndex, часовой пояс, normalize_path),
+    normalize_path приводит параметр file к ключу хранилища (пути относительно хранилища).
+    Хранилище выбирается параметром vault, по умолчанию - первое.
+    GET /tasks?vault=&status=&complexity=&file=&due_from=&due_to=&remind_from=&remind_to=&overdue=&offset=&limit=
+    GET /status
+    """
+    from aiohttp import web
+
+    default_vault = next(iter(vaults))
+
+    async def handle_tasks(request):
+        name = request.query.get('vault', default_vault)
+        if name not in vaults:
+            return web.json_response({'error': f"неизвестное хранилище: {name}"}, status=404)
+        index, timezone, normalize_path = vaults[name]
+
+        try:
+            query = parse_query(request.query, timezone, normalize_path)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+
+        offset, limit = query['offset'], query['limit']
+        version, total, tasks = index.query(**query)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/json; charset=utf-8'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+
+        head = json.dumps({'vault': name, 'version': version, 'total': total, 'offset': offset, 'limit': limit},
+                          ensure_ascii=False)
+        await response.write(f'{head[:-1]}, "tasks": ['.encode('utf-8'))
+        for start in range(0, len(tasks), STREAM_CHUNK_SIZE):
+            chunk = ', '.join(
+                json.dumps(task_to_json(task), ensure_ascii=False)
+                for task in tasks[start:start + STREAM_CHUNK_SIZE]
+            )
+            await response.write(((', ' if start else '') + chunk).encode('utf-8'))
+        await response.write(b']}')
+        await response.write_eof()
+        return response
+
+    async def handle_status(request):
+        return web.json_response({
+            name: {
+                'version': index.version,
+                'tasks': len(index),
+                'updated_at': index.updated_at
+            }
+            for name, (index, _, _) in vaults.items()
+        })
+
+    app = web.Application()
+    app.router.add_get('/tasks', handle_tasks)
+    app.router.add_get('/status', handle_status)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"API задач доступно на http://{host}:{port}/tasks")
+    return runner
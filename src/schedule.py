@@ -0,0 +1,126 @@
+"""
+Расписание напоминаний, упорядоченное по времени срабатывания
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from sortedcontainers import SortedList
+
+
+def notification_key(task):
+    """
+    Ключ отправки напоминания: id задачи и время напоминания, поэтому
+    правка текста не приводит к повторной отправке, а перенос времени - приводит.
+    """
+    return f"{task.id}@{task.notification}"
+
+
+class NotificationSchedule:
+    """
+    Хранит ожидающие напоминания в порядке времени срабатывания.
+    Обновляется событиями TaskStore, поэтому изменение одного файла
+    не требует пересчета всех задач хранилища.
+    """
+
+    def __init__(self, timezone, lead_time=timedelta(minutes=5), condition=None):
+        self.timezone = timezone
+        self.lead_time = lead_time
+        # Очередь (время напоминания, id задачи), отсортированная по времени
+        self._queue = SortedList()
+        # id задачи -> (время напоминания, задача)
+        self._entries = {}
+        # Несколько расписаний могут делить одно условие, чтобы ждать ближайшее из них (wait_any)
+        self._condition = condition if condition is not None else threading.Condition()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _discard(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is not None:
+            self._queue.discard((entry[0], task_id))
+
+    def _add(self, task, now):
+        notification_time = task.notification_at
+        # Напоминания из прошлого уже никогда не сработают
+        if task.status != 'TODO' or notification_time is None or notification_time < now:
+            return
+
+        self._entries[task.id] = (notification_time, task)
+        self._queue.add((notification_time, task.id))
+
+    def apply_events(self, events):
+        """Применяет события изменения задач (подписчик TaskStore)"""
+        now = datetime.now(self.timezone)
+        with self._condition:
+            for event in events:
+                if event.old is not None:
+                    self._discard(event.old.id)
+                if event.new is not None:
+                    self._add(event.new, now)
+            self._condition.notify_all()
+
+    def wake(self):
+        """Будит поток, ожидающий в wait()"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def clear(self):
+        with self._condition:
+            self._queue.clear()
+            self._entries.clear()
+            self._condition.notify_all()
+
+    def pop_due(self, now):
+        """
+        Извлекает напоминания, время которых наступает в пределах lead_time.
+        Возвращает список пар (ключ отправки, задача); просроченные отбрасываются.
+        """
+        due = []
+        with self._condition:
+            while self._queue and self._queue[0][0] - self.lead_time <= now:
+                notification_time, task_id = self._queue.pop(0)
+                _, task = self._entries.pop(task_id)
+                if notification_time >= now:
+                    due.append((notification_key(task), task))
+        return due
+
+    def restore(self, tasks):
+        """
+        Возвращает в расписание напоминания, которые не удалось доставить.
+        tasks - текущие версии задач. Задачи, которые уже снова в расписании (файл изменился
+        во время отправки), выполненные и с прошедшим временем напоминания пропускаются.
+        """
+        now = datetime.now(self.timezone)
+        with self._condition:
+            for task in tasks:
+                if task.id not in self._entries:
+                    self._add(task, now)
+            self._condition.notify_all()
+
+    def next_wakeup(self):
+        """Время, когда сработает ближайшее напоминание, или None"""
+        with self._condition:
+            if not self._queue:
+                return None
+            return self._queue[0][0] - self.lead_time
+
+
+def wait_any(schedules, max_timeout):
+    """
+    Спит до ближайшего напоминания любого из расписаний (но не дольше max_timeout секунд).
+    Расписания должны быть созданы с общим condition.
+    """
+    if not schedules:
+        return
+    condition = schedules[0]._condition
+    with condition:
+        timeout = max_timeout
+        for schedule in schedules:
+            wakeup = schedule.next_wakeup()
+            if wakeup is not None:
+                delay = (wakeup - datetime.now(schedule.timezone)).total_seconds()
+                timeout = max(0.0, min(delay, timeout))
+        if timeout > 0:
+            condition.wait(timeout)
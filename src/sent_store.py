@@ -0,0 +1,163 @@
+"""
+Хранилище отправленных напоминаний (SQLite в режиме WAL)
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SentStore:
+    """
+    Помнит ключи доставленных напоминаний между перезапусками.
+    Проверка выполняется по словарю в памяти, запись в SQLite идет пачками через flush().
+    Записи, время напоминания которых прошло больше чем grace секунд назад, удаляются,
+    поэтому размер хранилища ограничен числом напоминаний за последние grace секунд.
+    Без пути к базе работает только в памяти (с той же очисткой).
+    Если базу не удается открыть (например, каталог недоступен для записи),
+    хранилище тоже переходит в режим только в памяти.
+    """
+
+    def __init__(self, path, grace=86400, batch_size=100, prune_interval=3600):
+        self.path = path
+        self.grace = grace
+        self.batch_size = batch_size
+        self.prune_interval = prune_interval
+        # ключ отправки -> время напоминания (unix time)
+        self._keys = {}
+        # Строки, еще не записанные в базу: (ключ, время, файл, текст задачи)
+        self._pending = []
+        self._connection = None
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def _connect(self):
+        if self._connection is None and self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sent ('
+                'key TEXT PRIMARY KEY, notify_at REAL NOT NULL, filename TEXT, task TEXT)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS sent_notify_at ON sent (notify_at)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def load(self, tasks=(), now=None):
+        """
+        Загружает неустаревшие ключи из базы.
+        Если идентификаторы задач изменились (например, кэш парсинга сброшен),
+        записи сопоставляются с задачами tasks по файлу, тексту и времени напоминания.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            try:
+                connection = self._connect()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Не удалось открыть хранилище отправленных напоминаний {self.path}: {e}, "
+                               f"отправленные напоминания хранятся только в памяти")
+                self.path = None
+                return
+            if connection is None:
+                return
+
+            try:
+                connection.execute('DELETE FROM sent WHERE notify_at < ?', (now - self.grace,))
+                connection.commit()
+                rows = connection.execute('SELECT key, notify_at, filename, task FROM sent').fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка чтения хранилища отправленных напоминаний {self.path}: {e}")
+                return
+
+            by_content = {}
+            for key, notify_at, filename, text in rows:
+                self._keys[key] = notify_at
+                by_content[(filename, text, notify_at)] = key
+
+            remapped = 0
+            for task in tasks:
+                if task.notification_at is None:
+                    continue
+                key = f"{task.id}@{task.notification}"
+                if key in self._keys:
+                    continue
+                notify_at = task.notification_at.timestamp()
+                if (task.filename, task.task, notify_at) in by_content:
+                    self._keys[key] = notify_at
+                    self._pending.append((key, notify_at, task.filename, task.task))
+                    remapped += 1
+
+        self.flush()
+        self._next_prune = now + self.prune_interval
+        logger.info(f"Загружено отправленных напоминаний: {len(self._keys)} (сопоставлено заново: {remapped})")
+
+    def add(self, key, task):
+        """Отмечает напоминание задачи отправленным"""
+        notify_at = task.notification_at.timestamp() if task.notification_at is not None else time.time()
+        with self._lock:
+            self._keys[key] = notify_at
+            if self.path:
+                self._pending.append((key, notify_at, task.filename, task.task))
+            flush = len(self._pending) >= self.batch_size
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленные ключи в базу одной транзакцией"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                connection = self._connect()
+                if connection is None:
+                    return
+                with connection:
+                    connection.executemany('INSERT OR REPLACE INTO sent VALUES (?, ?, ?, ?)', pending)
+            except (sqlite3.Error, OSError) as e:
+                # Ключи остаются в памяти, запись повторится при следующем flush()
+                self._pending = pending + self._pending
+                logger.warning(f"Не удалось сохранить отправленные напоминания: {e}")
+
+    def prune(self, now=None):
+        """Удаляет записи старше grace секунд (не чаще раза в prune_interval)"""
+        now = time.time() if now is None else now
+        if now < self._next_prune:
+            return
+        self._next_prune = now + self.prune_interval
+        cutoff = now - self.grace
+
+        with self._lock:
+            expired = [key for key, notify_at in self._keys.items() if notify_at < cutoff]
+            for key in expired:
+                del self._keys[key]
+            self._pending = [row for row in self._pending if row[1] >= cutoff]
+            if self._connection is not None:
+                try:
+                    with self._connection:
+                        self._connection.execute('DELETE FROM sent WHERE notify_at < ?', (cutoff,))
+                except sqlite3.Error as e:
+                    logger.warning(f"Не удалось очистить хранилище отправленных напоминаний: {e}")
+
+        if expired:
+            logger.info(f"Удалено устаревших отправленных напоминаний: {len(expired)}")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
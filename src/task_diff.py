@@ -0,0 +1,100 @@
+"""
+Сравнение старой и новой версии задач файла
+"""
+
+import random
+from collections import deque, namedtuple
+
+# kind: added, removed, completed, reopened, rescheduled, updated
+# old/new - версии задачи до и после изменения (None для added/removed)
+TaskEvent = namedtuple('TaskEvent', ['kind', 'filename', 'old', 'new'])
+
+
+def new_task_id():
+    # 64 случайных бита: коллизии на миллионах задач практически исключены
+    return random.getrandbits(64)
+
+
+def match_tasks(old_tasks, new_tasks):
+    """
+    Сопоставляет новые задачи файла старым и переносит на них идентификаторы.
+    Задача считается той же самой, если совпадает (по порядку):
+    1. очищенный текст задачи;
+    2. время напоминания;
+    3. позиция в файле среди задач.
+    Возвращает (пары (старая, новая), добавленные, удаленные).
+    """
+    pairs = []
+    matched_old = set()
+
+    by_text = {}
+    for task in old_tasks:
+        by_text.setdefault(task.task, deque()).append(task)
+
+    unmatched_new = []
+    for task in new_tasks:
+        candidates = by_text.get(task.task)
+        if candidates:
+            old = candidates.popleft()
+            pairs.append((old, task))
+            matched_old.add(id(old))
+        else:
+            unmatched_new.append(task)
+
+    if unmatched_new and len(matched_old) < len(old_tasks):
+        by_notification = {}
+        for task in old_tasks:
+            if id(task) not in matched_old and task.notification_at is not None:
+                by_notification.setdefault(task.notification_at, deque()).append(task)
+
+        still_unmatched = []
+        for task in unmatched_new:
+            candidates = by_notification.get(task.notification_at)
+            if candidates:
+                old = candidates.popleft()
+                pairs.append((old, task))
+                matched_old.add(id(old))
+            else:
+                still_unmatched.append(task)
+        unmatched_new = still_unmatched
+
+    if unmatched_new and len(matched_old) < len(old_tasks):
+        positions = {id(task): index for index, task in enumerate(new_tasks)}
+        still_unmatched = []
+        for task in unmatched_new:
+            index = positions[id(task)]
+            old = old_tasks[index] if index < len(old_tasks) else None
+            if old is not None and id(old) not in matched_old:
+                pairs.append((old, task))
+                matched_old.add(id(old))
+            else:
+                still_unmatched.append(task)
+        unmatched_new = still_unmatched
+
+    for old, task in pairs:
+        task.id = old.id
+    for task in unmatched_new:
+        if task.id is None:
+            task.id = new_task_id()
+
+    removed = [task for task in old_tasks if id(task) not in matched_old]
+    return pairs, unmatched_new, removed
+
+
+def diff_tasks(filename, old_tasks, new_tasks):
+    """Возвращает список TaskEvent, описывающих переход от old_tasks к new_tasks"""
+    pairs, added, removed = match_tasks(old_tasks, new_tasks)
+
+    events = [TaskEvent('removed', filename, task, None) for task in removed]
+    for old, new in pairs:
+        if old == new:
+            continue
+        if old.status != new.status:
+            kind = 'completed' if new.status == 'DONE' else 'reopened'
+        elif old.notification_at != new.notification_at or old.due_day != new.due_day:
+            kind = 'rescheduled'
+        else:
+            kind = 'updated'
+        events.append(TaskEvent(kind, filename, old, new))
+    events.extend(TaskEvent('added', filename, None, task) for task in added)
+    return events
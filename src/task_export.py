@@ -0,0 +1,345 @@
+"""
+Колоночная выгрузка индекса задач для аналитики
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from task_record import from_epoch_day, to_epoch_day
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OBTX1\n'
+# Записи журнала: словарь файлов и блок задач файла
+RECORD_FILE = b'F'
+RECORD_BLOCK = b'B'
+FILE_HEADER = struct.Struct('<IH')
+BLOCK_HEADER = struct.Struct('<II16s')
+
+# Значение отсутствующей даты, напоминания или длительности
+MISSING = -2 ** 31
+
+STATUS_CODES = {'TODO': 0, 'DONE': 1}
+
+# Колонки блока в порядке записи: имя, тип array
+COLUMNS = (
+    ('status', 'b'),
+    ('complexity', 'b'),
+    ('due_day', 'i'),
+    ('completed_day', 'i'),
+    ('duration', 'i'),
+    ('notification', 'q'),
+    ('id', 'Q'),
+)
+ROW_SIZE = sum(array(typecode).itemsize for _, typecode in COLUMNS)
+EMPTY_DIGEST = hashlib.blake2b(b'', digest_size=16).digest()
+# Журнал переписывается из текущего индекса, когда устаревших блоков больше, чем актуальных
+COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def _to_bytes(column):
+    # Файл всегда в little-endian, чтобы выгрузку можно было читать на другой машине
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode_tasks(tasks):
+    """Кодирует задачи файла в байты колонок блока"""
+    columns = [array(typecode) for _, typecode in COLUMNS]
+    status, complexity, due_day, completed_day, duration, notification, task_id = columns
+    for task in tasks:
+        status.append(STATUS_CODES.get(task.status, 0))
+        complexity.append(task.complexity or 0)
+        due_day.append(task.due_day if task.due_day is not None else MISSING)
+        # Дата выполнения: "✅ ГГГГ-ММ-ДД" или дата из @completed(...)
+        day = to_epoch_day(task.completed_date or (task.completed or '')[:10])
+        completed_day.append(day if day is not None else MISSING)
+        duration.append(task.duration if task.duration is not None else MISSING)
+        notification.append(int(task.notification_at.timestamp()) if task.notification_at is not None else MISSING)
+        task_id.append(task.id)
+    return b''.join(_to_bytes(column) for column in columns)
+
+
+class ColumnarExport:
+    """
+    Журнал колоночных блоков задач: при изменении файла в конец дописывается
+    блок с его задачами, который заменяет предыдущий блок этого файла.
+    Подписчик TaskStore; неизменившиеся файлы (по хэшу блока) не переписываются,
+    поэтому повторное сканирование после перезапуска почти ничего не пишет.
+    """
+
+    def __init__(self, path, store):
+        self.path = path
+        self.store = store
+        # filename -> [id файла, хэш блока, размер записи блока]
+        self._files = {}
+        self._next_file_id = 0
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Читает заголовки журнала; недописанная запись в конце (после сбоя) отрезается"""
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать выгрузку {self.path}: {e}")
+            return
+
+        if not data.startswith(MAGIC):
+            logger.warning(f"Выгрузка {self.path} имеет неизвестный формат и будет перезаписана")
+            self._rewrite(self.store.snapshot())
+            return
+
+        names = {}
+        # Журнал из одного заголовка (выгрузка пустого хранилища) - целый
+        end = len(MAGIC)
+        for kind, pos, file_id, payload, record_end in iter_records(data):
+            if kind == RECORD_FILE:
+                names[file_id] = payload
+                self._next_file_id = max(self._next_file_id, file_id + 1)
+                self._live_bytes += record_end - pos
+            else:
+                rows, digest = payload
+                filename = names.get(file_id)
+                previous = self._files.get(filename)
+                if previous is not None:
+                    self._live_bytes -= previous[2]
+                    self._dead_bytes += previous[2]
+                self._files[filename] = [file_id, digest, record_end - pos]
+                self._live_bytes += record_end - pos
+            end = record_end
+
+        if end < len(data):
+            logger.warning(f"Выгрузка {self.path} обрезана до последней целой записи")
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+
+    def apply_events(self, events):
+        """Дописывает блоки файлов, задачи которых изменились (подписчик TaskStore)"""
+        filenames = dict.fromkeys(event.filename for event in events)
+        self.write_files(filenames, self.store.snapshot())
+
+    def clear(self):
+        # Выгрузка переживает сброс индекса: после повторного сканирования
+        # дописываются только файлы с другим содержимым
+        pass
+
+    def sync(self):
+        """Сверяет выгрузку с индексом после полного сканирования: удаленные файлы получают пустой блок"""
+        snapshot = self.store.snapshot()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            missing = [filename for filename, entry in self._files.items()
+                       if filename not in snapshot and entry[1] != EMPTY_DIGEST]
+        self.write_files(missing, snapshot)
+
+    def write_files(self, filenames, snapshot):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            records = []
+            for filename in filenames:
+                payload = encode_tasks(snapshot.get_file(filename))
+                digest = hashlib.blake2b(payload, digest_size=16).digest()
+                entry = self._files.get(filename)
+                if entry is not None and entry[1] == digest:
+                    continue
+
+                if entry is None:
+                    # Файл без задач в выгрузку не попадает, пока задачи не появятся
+                    if not payload:
+                        continue
+                    entry = self._files[filename] = [self._next_file_id, None, 0]
+                    self._next_file_id += 1
+                    name = filename.encode('utf-8')
+                    record = RECORD_FILE + FILE_HEADER.pack(entry[0], len(name)) + name
+                    records.append(record)
+                    self._live_bytes += len(record)
+
+                record = RECORD_BLOCK + BLOCK_HEADER.pack(entry[0], len(payload) // ROW_SIZE, digest) + payload
+                records.append(record)
+                self._live_bytes += len(record) - entry[2]
+                self._dead_bytes += entry[2]
+                entry[1], entry[2] = digest, len(record)
+
+            if not records:
+                return
+
+            if self._dead_bytes > max(self._live_bytes, COMPACT_MIN_BYTES):
+                self._rewrite(snapshot)
+                return
+
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'ab') as f:
+                    if f.tell() == 0:
+                        f.write(MAGIC)
+                    f.write(b''.join(records))
+            except OSError as e:
+                logger.warning(f"Не удалось дописать выгрузку {self.path}: {e}")
+
+    def _rewrite(self, snapshot):
+        """Переписывает журнал из текущего индекса, оставляя по одному блоку на файл"""
+        self._files = {}
+        self._next_file_id = 0
+        self._live_bytes = self._dead_bytes = 0
+
+        records = [MAGIC]
+        for filename in snapshot.files():
+            payload = encode_tasks(snapshot.get_file(filename))
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            file_id = self._next_file_id
+            self._next_file_id += 1
+            name = filename.encode('utf-8')
+            record = RECORD_FILE + FILE_HEADER.pack(file_id, len(name)) + name
+            block = RECORD_BLOCK + BLOCK_HEADER.pack(file_id, len(payload) // ROW_SIZE, digest) + payload
+            records.extend((record, block))
+            self._files[filename] = [file_id, digest, len(block)]
+            self._live_bytes += len(record) + len(block)
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(records))
+            os.replace(tmp_path, self.path)
+            logger.info(f"Выгрузка {self.path} сжата, файлов: {len(self._files)}")
+        except OSError as e:
+            logger.warning(f"Не удалось переписать выгрузку {self.path}: {e}")
+
+
+def iter_records(data):
+    """
+    Разбирает журнал: (тип, начало записи, id файла, данные, конец записи).
+    Для записи файла данные - путь, для блока - (строк, хэш). Останавливается на недописанной записи.
+    """
+    pos = len(MAGIC)
+    size = len(data)
+    while pos < size:
+        kind = data[pos:pos + 1]
+        start = pos + 1
+        if kind == RECORD_FILE:
+            if start + FILE_HEADER.size > size:
+                return
+            file_id, name_length = FILE_HEADER.unpack_from(data, start)
+            end = start + FILE_HEADER.size + name_length
+            if end > size:
+                return
+            yield kind, pos, file_id, bytes(data[start + FILE_HEADER.size:end]).decode('utf-8'), end
+        elif kind == RECORD_BLOCK:
+            if start + BLOCK_HEADER.size > size:
+                return
+            file_id, rows, digest = BLOCK_HEADER.unpack_from(data, start)
+            end = start + BLOCK_HEADER.size + rows * ROW_SIZE
+            if end > size:
+                return
+            yield kind, pos, file_id, (rows, digest), end
+        else:
+            return
+        pos = end
+
+
+class TaskColumns:
+    """
+    Задачи выгрузки в виде колонок array: status, complexity, due_day, completed_day,
+    duration, notification, id и file_id (индекс в списке files).
+    Отсутствующие значения - MISSING.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.file_id = array('I')
+
+    def __len__(self):
+        return len(self.id)
+
+
+def load_columns(path):
+    """
+    Загружает актуальные блоки выгрузки в колонки. Значения копируются из байтов блоков
+    целиком (array.frombytes), объекты на строку не создаются.
+    """
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} не является колоночной выгрузкой задач")
+
+    names = {}
+    # id файла -> (смещение колонок, строк) последнего блока
+    latest = {}
+    for kind, pos, file_id, payload, end in iter_records(data):
+        if kind == RECORD_FILE:
+            names[file_id] = payload
+        else:
+            latest[file_id] = (pos + 1 + BLOCK_HEADER.size, payload[0])
+
+    file_ids = sorted(file_id for file_id, (_, rows) in latest.items() if rows)
+    result = TaskColumns([names[file_id] for file_id in file_ids])
+    for index, file_id in enumerate(file_ids):
+        offset, rows = latest[file_id]
+        for name, typecode in COLUMNS:
+            size = rows * array(typecode).itemsize
+            getattr(result, name).frombytes(data[offset:offset + size])
+            offset += size
+        result.file_id.extend(array('I', [index]) * rows)
+
+    if sys.byteorder == 'big':
+        for name, _ in COLUMNS:
+            getattr(result, name).byteswap()
+    return result
+
+
+def monthly_stats(columns):
+    """
+    Помесячная статистика по колонкам выгрузки:
+    due / due_done - задачи с датой (📅) в этом месяце и выполненные из них (доля выполнения),
+    completed / duration - выполненные в этом месяце задачи и их длительность в минутах,
+    complexity - выполненные задачи по сложности (0 - без сложности, 1-3).
+    """
+    months = {}
+    month_of_day = {}
+
+    def month(day):
+        key = month_of_day.get(day)
+        if key is None:
+            key = month_of_day[day] = from_epoch_day(day)[:7]
+        return key
+
+    def row(key):
+        stats = months.get(key)
+        if stats is None:
+            stats = months[key] = {'month': key, 'due': 0, 'due_done': 0, 'completed': 0, 'duration': 0,
+                                   'complexity': [0, 0, 0, 0]}
+        return stats
+
+    for status, complexity, due_day, completed_day, duration in zip(
+            columns.status, columns.complexity, columns.due_day, columns.completed_day, columns.duration):
+        if due_day != MISSING:
+            stats = row(month(due_day))
+            stats['due'] += 1
+            stats['due_done'] += status
+        if status and completed_day != MISSING:
+            stats = row(month(completed_day))
+            stats['completed'] += 1
+            stats['complexity'][complexity] += 1
+            if duration > 0:
+                stats['duration'] += duration
+
+    return [months[key] for key in sorted(months)]
@@ -0,0 +1,150 @@
+"""
+Вторичные индексы задач для запросов с фильтрами
+"""
+
+import threading
+import time
+
+from sortedcontainers import SortedList
+
+NO_DAY = float('inf')
+
+
+class TaskIndex:
+    """
+    Индексирует задачи по статусу, сложности, файлу, дате выполнения (📅)
+    и времени напоминания. Обновляется событиями TaskStore.
+    Запрос перебирает только самый узкий из подходящих индексов,
+    остальные условия проверяются на его задачах.
+    version увеличивается при каждом изменении индекса.
+    """
+
+    def __init__(self):
+        # id задачи -> задача
+        self._tasks = {}
+        # значение -> множество id задач
+        self._by_status = {}
+        self._by_complexity = {}
+        self._by_file = {}
+        # (номер дня, id) и (время напоминания unix time, id)
+        self._by_due = SortedList()
+        self._by_reminder = SortedList()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.updated_at = None
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _index_add(self, index, key, task_id):
+        index.setdefault(key, set()).add(task_id)
+
+    def _index_remove(self, index, key, task_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(task_id)
+            if not ids:
+                del index[key]
+
+    def _add(self, task):
+        self._tasks[task.id] = task
+        self._index_add(self._by_status, task.status, task.id)
+        self._index_add(self._by_complexity, task.complexity or 0, task.id)
+        self._index_add(self._by_file, task.filename, task.id)
+        if task.due_day is not None:
+            self._by_due.add((task.due_day, task.id))
+        if task.notification_at is not None:
+            self._by_reminder.add((task.notification_at.timestamp(), task.id))
+
+    def _remove(self, task):
+        if self._tasks.pop(task.id, None) is None:
+            return
+        self._index_remove(self._by_status, task.status, task.id)
+        self._index_remove(self._by_complexity, task.complexity or 0, task.id)
+        self._index_remove(self._by_file, task.filename, task.id)
+        if task.due_day is not None:
+            self._by_due.discard((task.due_day, task.id))
+        if task.notification_at is not None:
+            self._by_reminder.discard((task.notification_at.timestamp(), task.id))
+
+    def apply_events(self, events):
+        """Применяет события изменения задач (подписчик TaskStore)"""
+        with self._lock:
+            for event in events:
+                if event.old is not None:
+                    self._remove(event.old)
+                if event.new is not None:
+                    self._add(event.new)
+            self.version += 1
+            self.updated_at = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self._by_status.clear()
+            self._by_complexity.clear()
+            self._by_file.clear()
+            self._by_due.clear()
+            self._by_reminder.clear()
+            self.version += 1
+            self.updated_at = time.time()
+
+    def _range(self, sorted_list, start, end):
+        """Количество и итератор id в диапазоне [start, end] (границы могут быть None)"""
+        low = sorted_list.bisect_left((start,)) if start is not None else 0
+        high = sorted_list.bisect_right((end, NO_DAY)) if end is not None else len(sorted_list)
+        return max(0, high - low), (task_id for _, task_id in sorted_list.islice(low, high))
+
+    def query(self, status=None, complexity=None, filename=None, due_from=None, due_to=None,
+              remind_from=None, remind_to=None, offset=0, limit=100):
+        """
+        Возвращает (version, число найденных задач, задачи страницы).
+        due_from/due_to - номера дней, remind_from/remind_to - unix time, границы включительно.
+        Задачи упорядочены по дате выполнения, времени напоминания, файлу и id.
+        """
+        checks = []
+        if status is not None:
+            checks.append(lambda task: task.status == status)
+        if complexity is not None:
+            checks.append(lambda task: (task.complexity or 0) == complexity)
+        if filename is not None:
+            checks.append(lambda task: task.filename == filename)
+        if due_from is not None or due_to is not None:
+            checks.append(lambda task: task.due_day is not None
+                          and (due_from is None or task.due_day >= due_from)
+                          and (due_to is None or task.due_day <= due_to))
+        if remind_from is not None or remind_to is not None:
+            checks.append(lambda task: task.notification_at is not None
+                          and (remind_from is None or task.notification_at.timestamp() >= remind_from)
+                          and (remind_to is None or task.notification_at.timestamp() <= remind_to))
+
+        with self._lock:
+            version = self.version
+            candidates = [(len(self._tasks), iter(self._tasks))]
+            if status is not None:
+                ids = self._by_status.get(status, ())
+                candidates.append((len(ids), iter(ids)))
+            if complexity is not None:
+                ids = self._by_complexity.get(complexity, ())
+                candidates.append((len(ids), iter(ids)))
+            if filename is not None:
+                ids = self._by_file.get(filename, ())
+                candidates.append((len(ids), iter(ids)))
+            if due_from is not None or due_to is not None:
+                candidates.append(self._range(self._by_due, due_from, due_to))
+            if remind_from is not None or remind_to is not None:
+                candidates.append(self._range(self._by_reminder, remind_from, remind_to))
+
+            # Перебираем самый узкий индекс
+            _, ids = min(candidates, key=lambda candidate: candidate[0])
+            tasks = self._tasks
+            found = [tasks[task_id] for task_id in ids
+                     if all(check(tasks[task_id]) for check in checks)]
+
+        found.sort(key=lambda task: (
+            task.due_day if task.due_day is not None else NO_DAY,
+            task.notification_at.timestamp() if task.notification_at is not None else NO_DAY,
+            task.filename,
+            task.id
+        ))
+        return version, len(found), found[offset:offset + limit]
@@ -0,0 +1,116 @@
+"""
+Компактная запись задачи
+"""
+
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+
+NOTIFICATION_TIME_FORMAT = '%Y-%m-%d %H:%M'
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_day(iso_date):
+    """Переводит дату ГГГГ-ММ-ДД в номер дня от 1970-01-01 (None для некорректной даты)"""
+    try:
+        return date.fromisoformat(iso_date).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        return None
+
+
+def from_epoch_day(day):
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+@lru_cache(maxsize=8192)
+def parse_notification_time(notification, timezone):
+    """
+    Переводит время напоминания "ГГГГ-ММ-ДД ЧЧ:ММ" в datetime с часовым поясом
+    (None для некорректного времени). Одинаковые значения разделяют один объект datetime.
+    """
+    try:
+        day, clock = notification.split()
+        year, month, day_of_month = day.split('-')
+        hour, minute = clock.split(':')
+        return timezone.localize(datetime(int(year), int(month), int(day_of_month), int(hour), int(minute)))
+    except (AttributeError, ValueError):
+        return None
+
+
+class Task:
+    """
+    Задача из файла Obsidian.
+    Путь к файлу интернируется, время напоминания и дата выполнения
+    вычисляются один раз при парсинге. Для шаблонов и кэша есть словарное
+    представление as_dict() в прежнем формате задач.
+    """
+
+    __slots__ = (
+        'status', 'filename', 'raw_line', 'task', 'complexity', 'due_day',
+        'completed_date', 'completed', 'notification_at', 'duration', 'id'
+    )
+
+    def __init__(self, status, filename, raw_line, task, complexity=None, due_day=None,
+                 completed_date=None, completed=None, notification_at=None, duration=0, id=None):
+        self.status = sys.intern(status)
+        self.filename = sys.intern(filename)
+        self.raw_line = raw_line
+        self.task = task
+        self.complexity = complexity
+        # Дата выполнения (📅) - номер дня от 1970-01-01
+        self.due_day = due_day
+        self.completed_date = completed_date
+        self.completed = completed
+        # Время напоминания - datetime с часовым поясом
+        self.notification_at = notification_at
+        # None, если помидорка указана с ошибкой
+        self.duration = duration
+        self.id = id
+
+    @property
+    def notification(self):
+        if self.notification_at is None:
+            return None
+        return self.notification_at.strftime(NOTIFICATION_TIME_FORMAT)
+
+    @property
+    def date(self):
+        if self.due_day is None:
+            return None
+        return from_epoch_day(self.due_day)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Task):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Task({self.as_dict()!r})"
+
+    def as_dict(self):
+        """Словарное представление задачи"""
+        ret = {
+            'status': self.status,
+            'filename': self.filename,
+            'raw_line': self.raw_line
+        }
+        if self.complexity is not None:
+            ret['complexity'] = self.complexity
+        if self.due_day is not None:
+            ret['date'] = self.date
+        if self.completed_date is not None:
+            ret['completed_date'] = self.completed_date
+        if self.completed is not None:
+            ret['completed'] = self.completed
+        ret['notification'] = self.notification
+        if self.duration is not None:
+            ret['duration'] = self.duration
+        ret['task'] = self.task
+        if self.id is not None:
+            ret['id'] = self.id
+        return ret
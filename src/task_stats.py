@@ -0,0 +1,124 @@
+"""
+Счетчики задач для сводки, обновляемые событиями хранилища
+"""
+
+import threading
+from collections import Counter
+
+from sortedcontainers import SortedList
+
+
+class TaskStats:
+    """
+    Поддерживает количество задач по статусам, сложности и файлам,
+    а также упорядоченный по времени список напоминаний незавершенных задач.
+    Обновляется событиями TaskStore, поэтому сводка не требует прохода по всем задачам.
+    Счетчики меняет поток обработки файлов, поэтому читатели из других потоков
+    держат lock (он занят только на время обновления счетчиков, а не парсинга).
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.total = 0
+        self.by_status = Counter()
+        # (сложность, статус) -> количество; задачи без сложности учитываются как 0
+        self.by_complexity = Counter()
+        # filename -> Counter по статусам
+        self.by_file = {}
+        # (-число незавершенных задач, filename) для файлов с незавершенными задачами
+        self._pending_files = SortedList()
+        # (время напоминания, id задачи) для незавершенных задач с напоминанием
+        self._reminders = SortedList()
+        self._reminder_tasks = {}
+
+    def _count(self, counter, key, delta):
+        counter[key] += delta
+        if counter[key] <= 0:
+            del counter[key]
+
+    def _add(self, task):
+        self.total += 1
+        self._count(self.by_status, task.status, 1)
+        self._count(self.by_complexity, (task.complexity or 0, task.status), 1)
+        file_counter = self.by_file.get(task.filename)
+        if file_counter is None:
+            file_counter = self.by_file[task.filename] = Counter()
+        self._count(file_counter, task.status, 1)
+
+        if task.status == 'TODO' and task.notification_at is not None:
+            self._reminders.add((task.notification_at, task.id))
+            self._reminder_tasks[task.id] = task
+
+    def _remove(self, task):
+        self.total -= 1
+        self._count(self.by_status, task.status, -1)
+        self._count(self.by_complexity, (task.complexity or 0, task.status), -1)
+
+        file_counter = self.by_file.get(task.filename)
+        if file_counter is not None:
+            self._count(file_counter, task.status, -1)
+            if not file_counter:
+                del self.by_file[task.filename]
+
+        if task.status == 'TODO' and task.notification_at is not None:
+            self._reminders.discard((task.notification_at, task.id))
+            self._reminder_tasks.pop(task.id, None)
+
+    def _pending(self, filename):
+        file_counter = self.by_file.get(filename)
+        return file_counter.get('TODO', 0) if file_counter is not None else 0
+
+    def apply_events(self, events):
+        """Применяет события изменения задач (подписчик TaskStore)"""
+        with self.lock:
+            # Число незавершенных задач файлов до изменения: место файла в рейтинге
+            # обновляется один раз на пачку событий, а не на каждую задачу
+            touched = {}
+            for event in events:
+                if event.filename not in touched:
+                    touched[event.filename] = self._pending(event.filename)
+                if event.old is not None:
+                    self._remove(event.old)
+                if event.new is not None:
+                    self._add(event.new)
+
+            for filename, before in touched.items():
+                after = self._pending(filename)
+                if before != after:
+                    if before:
+                        self._pending_files.remove((-before, filename))
+                    if after:
+                        self._pending_files.add((-after, filename))
+
+    def clear(self):
+        with self.lock:
+            self.total = 0
+            self.by_status.clear()
+            self.by_complexity.clear()
+            self.by_file.clear()
+            self._pending_files.clear()
+            self._reminders.clear()
+            self._reminder_tasks.clear()
+
+    def status_counts(self):
+        """Копия счетчиков по статусам"""
+        with self.lock:
+            return dict(self.by_status)
+
+    def top_pending_files(self, limit):
+        """Файлы с наибольшим числом незавершенных задач: (filename, незавершенных, выполненных)"""
+        with self.lock:
+            return [
+                (filename, -negative_pending, self.by_file[filename].get('DONE', 0))
+                for negative_pending, filename in self._pending_files.islice(0, limit)
+            ]
+
+    def upcoming(self, start, end, limit=None):
+        """Незавершенные задачи с напоминанием в интервале [start, end], по возрастанию времени"""
+        tasks = []
+        with self.lock:
+            for notification_at, task_id in self._reminders.irange((start,), (end, float('inf'))):
+                tasks.append(self._reminder_tasks[task_id])
+                if limit is not None and len(tasks) >= limit:
+                    break
+        return tasks
@@ -0,0 +1,139 @@
+"""
+Хранилище задач с индексом по файлам
+"""
+
+import threading
+
+from task_diff import TaskEvent, diff_tasks
+
+
+class TaskSnapshot:
+    """
+    Неизменяемое состояние хранилища на момент публикации.
+    Словарь файлов и кортежи задач после публикации не меняются,
+    поэтому снимок можно читать из любого потока без блокировок.
+    """
+
+    __slots__ = ('_by_file', '_count', 'version')
+
+    def __init__(self, by_file, count, version):
+        # filename -> кортеж задач файла
+        self._by_file = by_file
+        self._count = count
+        self.version = version
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for tasks in self._by_file.values():
+            yield from tasks
+
+    def __contains__(self, filename):
+        return filename in self._by_file
+
+    def files(self):
+        return self._by_file.keys()
+
+    def get_file(self, filename):
+        return self._by_file.get(filename, ())
+
+
+EMPTY_SNAPSHOT = TaskSnapshot({}, 0, 0)
+
+
+class TaskStore:
+    """
+    Хранит задачи, сгруппированные по файлам.
+    Замена или удаление задач одного файла стоит O(задач в файле) плюс копия словаря файлов,
+    а не O(всех задач хранилища).
+    Писатели собирают новый TaskSnapshot и публикуют его одним присваиванием (copy-on-write),
+    читатели берут текущий снимок через snapshot() и не ждут писателей.
+    Изменения публикуются подписчикам в виде списка TaskEvent.
+    """
+
+    def __init__(self):
+        self._snapshot = EMPTY_SNAPSHOT
+        # Писатели выполняются по одному, чтобы события доходили до подписчиков в порядке изменений
+        self._write_lock = threading.Lock()
+        self._listeners = []
+
+    def snapshot(self):
+        """Текущий согласованный снимок задач"""
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __contains__(self, filename):
+        return filename in self._snapshot
+
+    def subscribe(self, listener):
+        """
+        Подписывает listener на изменения задач.
+        У подписчика вызываются apply_events(events) и clear().
+        """
+        self._listeners.append(listener)
+
+    def _publish(self, events):
+        if events:
+            for listener in self._listeners:
+                listener.apply_events(events)
+
+    def files(self):
+        return self._snapshot.files()
+
+    def get_file(self, filename):
+        return self._snapshot.get_file(filename)
+
+    def replace_file(self, filename, tasks):
+        """Заменяет задачи файла, возвращает список событий изменения"""
+        return self.replace_files([(filename, tasks)])
+
+    def replace_files(self, items):
+        """
+        Заменяет задачи нескольких файлов одной публикацией (словарь файлов копируется один раз).
+        items - пары (filename, задачи). Возвращает список событий изменения.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            by_file = dict(current._by_file)
+            count = len(current)
+            events = []
+
+            for filename, tasks in items:
+                old_tasks = by_file.pop(filename, ())
+                count -= len(old_tasks)
+
+                events.extend(diff_tasks(filename, old_tasks, tasks))
+                if tasks:
+                    by_file[filename] = tuple(tasks)
+                    count += len(tasks)
+
+            self._snapshot = TaskSnapshot(by_file, count, current.version + 1)
+            self._publish(events)
+        return events
+
+    def remove_file(self, filename):
+        """Удаляет задачи файла, возвращает список событий удаления"""
+        with self._write_lock:
+            current = self._snapshot
+            if filename not in current:
+                return []
+
+            by_file = dict(current._by_file)
+            old_tasks = by_file.pop(filename)
+
+            self._snapshot = TaskSnapshot(by_file, len(current) - len(old_tasks), current.version + 1)
+            events = [TaskEvent('removed', filename, task, None) for task in old_tasks]
+            self._publish(events)
+        return events
+
+    def clear(self):
+        with self._write_lock:
+            self._snapshot = TaskSnapshot({}, 0, self._snapshot.version + 1)
+            for listener in self._listeners:
+                listener.clear()
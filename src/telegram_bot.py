@@ -0,0 +1,85 @@
+"""
+Команды бота: длинный опрос getUpdates и ответы в чат
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CommandBot:
+    """
+    Получает сообщения через getUpdates с длинным опросом и вызывает обработчик команды.
+    handlers - команда (без "/") -> функция (chat_id, аргументы), возвращающая список ответов.
+    Команды принимаются только из allowed_chats, сообщения остальных чатов пропускаются.
+    Ответ сначала отправляется с Markdown, при ошибке разметки - обычным текстом.
+    """
+
+    def __init__(self, client, handlers, allowed_chats, poll_timeout=25, retry_delay=5.0):
+        self.client = client
+        self.handlers = handlers
+        self.allowed_chats = {str(chat_id) for chat_id in allowed_chats}
+        # Ожидание ответа getUpdates должно укладываться в таймаут запросов клиента
+        self.poll_timeout = max(0, min(poll_timeout, client.timeout - 5))
+        self.retry_delay = retry_delay
+        self.offset = None
+        # Фоновые отправки ответов, чтобы опрос не ждал очереди чата
+        self._replies = set()
+
+    async def run(self):
+        logger.info(f"Команды бота включены, чатов: {len(self.allowed_chats)}")
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                # Например, ответ 200 не в формате JSON: опрос не должен останавливаться молча
+                logger.error(f"Ошибка опроса команд бота: {e}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def poll(self):
+        """Один запрос getUpdates и обработка полученных команд"""
+        payload = {'timeout': self.poll_timeout, 'allowed_updates': ['message']}
+        if self.offset is not None:
+            payload['offset'] = self.offset
+        response = await self.client.call('getUpdates', payload)
+        if not response or not response.get('ok'):
+            await asyncio.sleep(self.retry_delay)
+            return
+
+        for update in response.get('result', []):
+            # Следующий запрос подтверждает полученные обновления
+            self.offset = update['update_id'] + 1
+            try:
+                self.handle_update(update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки команды бота: {e}")
+
+    def handle_update(self, update):
+        message = update.get('message') or {}
+        text = (message.get('text') or '').strip()
+        if not text.startswith('/'):
+            return
+
+        chat_id = str((message.get('chat') or {}).get('id'))
+        if chat_id not in self.allowed_chats:
+            logger.warning(f"Команда из неизвестного чата {chat_id} пропущена")
+            return
+
+        command, _, args = text[1:].partition(' ')
+        # В группах команда приходит как /find@имя_бота
+        command = command.split('@', 1)[0].lower()
+        handler = self.handlers.get(command) or self.handlers.get('help')
+        if handler is None:
+            return
+
+        logger.info(f"Команда бота /{command} из чата {chat_id}")
+        for reply in handler(chat_id, args.strip()):
+            task = asyncio.create_task(self.send_reply(chat_id, reply))
+            self._replies.add(task)
+            task.add_done_callback(self._replies.discard)
+
+    async def send_reply(self, chat_id, text):
+        if not await self.client.send_message(chat_id, text):
+            # Текст задач может содержать символы разметки Markdown
+            await self.client.send_message(chat_id, text, parse_mode=None)
@@ -0,0 +1,173 @@
+"""
+Клиент Telegram Bot API с общей сессией, очередью и ограничением частоты
+"""
+
+import logging
+import time
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# asyncio импортируется в методах: модуль загружают и разовые команды CLI, которые ничего не отправляют
+
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    'obsidian_telegram_request_seconds', 'Latency of Telegram Bot API requests.', ['method'])
+TELEGRAM_ERRORS = Counter(
+    'obsidian_telegram_errors_total', 'Failed Telegram Bot API requests by reason.', ['method', 'reason'])
+
+
+class TelegramClient:
+    """
+    Отправляет запросы к Bot API через одну aiohttp-сессию с пулом keep-alive соединений.
+    Сообщения каждого чата идут через отдельную очередь не чаще chat_interval секунд,
+    общий поток запросов ограничен global_rate запросами в секунду.
+    Ответы 429 и 5xx, а также сетевые ошибки повторяются с нарастающей задержкой.
+    """
+
+    def __init__(self, token, api_url='https://api.telegram.org', chat_interval=1.0,
+                 global_rate=30, pool_size=10, max_retries=5, timeout=30):
+        self.token = token
+        self.api_url = api_url.rstrip('/')
+        self.chat_interval = chat_interval
+        self.global_rate = global_rate
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._session = None
+        self._chat_queues = {}
+        self._workers = {}
+        self._next_global_slot = 0.0
+
+    async def _get_session(self):
+        # aiohttp импортируется при первом запросе: разовым командам CLI без отправки он не нужен
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """Останавливает очереди чатов и закрывает сессию"""
+        for worker in self._workers.values():
+            worker.cancel()
+        for queue in self._chat_queues.values():
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                if not future.done():
+                    future.set_result(False)
+        self._workers.clear()
+        self._chat_queues.clear()
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt):
+        return min(60.0, 2.0 ** attempt)
+
+    async def _acquire_global_slot(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_global_slot)
+        self._next_global_slot = slot + 1.0 / self.global_rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def call(self, method, payload):
+        """
+        Вызывает метод Bot API с повторами.
+        Возвращает разобранный JSON-ответ или None при ошибке.
+        """
+        import asyncio
+        import aiohttp
+
+        url = f"{self.api_url}/bot{self.token}/{method}"
+        session = await self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_global_slot()
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    if response.status == 200:
+                        result = await response.json(content_type=None)
+                        TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+                        return result
+
+                    body = await response.text()
+                    TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+                    TELEGRAM_ERRORS.inc(method, str(response.status))
+                    if response.status == 429:
+                        try:
+                            retry_after = float((await response.json(content_type=None))['parameters']['retry_after'])
+                        except Exception:
+                            retry_after = self._backoff(attempt)
+                    elif response.status >= 500:
+                        retry_after = self._backoff(attempt)
+                    else:
+                        logger.error(f"Ошибка Telegram {method}: {response.status} {body}")
+                        return None
+
+                    logger.warning(
+                        f"Telegram {method} ответил {response.status}, повтор через {retry_after:.1f} сек")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                TELEGRAM_ERRORS.inc(method, type(e).__name__)
+                retry_after = self._backoff(attempt)
+                logger.warning(f"Ошибка соединения с Telegram ({method}): {e}, повтор через {retry_after:.1f} сек")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(retry_after)
+
+        logger.error(f"Telegram {method}: исчерпаны попытки отправки")
+        return None
+
+    async def send_message(self, chat_id, text, parse_mode='Markdown'):
+        """
+        Ставит сообщение в очередь чата и ждет доставки. Возвращает True при успехе.
+        parse_mode=None - обычный текст без разметки.
+        """
+        import asyncio
+
+        queue = self._chat_queues.get(chat_id)
+        if queue is None:
+            queue = self._chat_queues[chat_id] = asyncio.Queue()
+            self._workers[chat_id] = asyncio.create_task(self._chat_worker(queue))
+
+        future = asyncio.get_running_loop().create_future()
+        payload = {
+            'chat_id': chat_id,
+            'text': text
+        }
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        await queue.put((payload, future))
+        return await future
+
+    async def _chat_worker(self, queue):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        next_send = 0.0
+        while True:
+            payload, future = await queue.get()
+            delay = next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                result = await self.call('sendMessage', payload)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке в Telegram: {e}")
+                result = None
+
+            next_send = loop.time() + self.chat_interval
+            if not future.done():
+                future.set_result(result is not None)
@@ -4,7 +4,6 @@
 
 import os
 from datetime import datetime, timedelta
-import pytz
 
 # Путь к папке с шаблонами
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
@@ -14,15 +13,18 @@ TEMPLATE_CONFIG = {
     'time_format': '%Y-%m-%d %H:%M',
     'date_format': '%Y-%m-%d',
     'summary_max_notifications': 5,
-    'notification_lead_time_minutes': 5
+    'summary_max_files': 5,
+    'notification_lead_time_minutes': 5,
+    # Максимальная длина сообщения Telegram
+    'message_max_length': 4096
 }
 
 
-def load_template(template_name):
+def load_template(template_name, templates_dir=TEMPLATES_DIR):
     """
     Загружает шаблон из файла
     """
-    template_path = os.path.join(TEMPLATES_DIR, f"{template_name}.j2")
+    template_path = os.path.join(templates_dir, f"{template_name}.j2")
     try:
         with open(template_path, 'r', encoding='utf-8') as f:
             return f.read()
@@ -32,7 +34,25 @@ def load_template(template_name):
         raise Exception(f"Ошибка загрузки шаблона {template_name}: {e}")
 
 
-def get_template_context(task=None, summary_data=None, error_data=None):
+def get_task_context(task):
+    """
+    Создает контекст одной задачи для уведомления
+    """
+    return {
+        'task': task.get('task', 'Неизвестная задача'),
+        'notification_time': task.get('notification', 'Не указано'),
+        'date': task.get('date'),
+        'filename': os.path.basename(task.get('filename', 'Неизвестный файл')),
+        'complexity': task.get('complexity'),
+        'complexity_emoji': get_complexity_emoji(task.get('complexity')),
+        'complexity_name': get_complexity_name(task.get('complexity')),
+        'duration': task.get('duration', '0'),
+        'status': task.get('status', 'TODO'),
+        'raw_line': task.get('raw_line', '')
+    }
+
+
+def get_template_context(task=None, summary_data=None, error_data=None, batch=None, search_data=None):
     """
     Создает контекст для рендеринга шаблонов
     """
@@ -40,16 +60,22 @@ def get_template_context(task=None, summary_data=None, error_data=None):
 
     if task:
         # Контекст для уведомления о задаче
+        context.update(get_task_context(task))
+
+    if batch:
+        # Контекст для пакета уведомлений
+        context.update({
+            'tasks': [get_task_context(batch_task) for batch_task in batch],
+            'tasks_count': len(batch)
+        })
+
+    if search_data:
+        # Контекст для ответа на команду бота (/find, /today)
         context.update({
-            'task': task.get('task', 'Неизвестная задача'),
-            'notification_time': task.get('notification', 'Не указано'),
-            'filename': os.path.basename(task.get('filename', 'Неизвестный файл')),
-            'complexity': task.get('complexity'),
-            'complexity_emoji': get_complexity_emoji(task.get('complexity')),
-            'complexity_name': get_complexity_name(task.get('complexity')),
-            'duration': task.get('duration', '0'),
-            'status': task.get('status', 'TODO'),
-            'raw_line': task.get('raw_line', '')
+            'title': search_data.get('title', ''),
+            'tasks': [get_task_context(found_task) for found_task in search_data.get('tasks', [])],
+            'tasks_count': len(search_data.get('tasks', [])),
+            'total_found': search_data.get('total', 0)
         })
 
     if summary_data:
@@ -59,6 +85,8 @@ def get_template_context(task=None, summary_data=None, error_data=None):
             'completed_tasks': summary_data.get('completed_tasks', 0),
             'pending_tasks': summary_data.get('pending_tasks', 0),
             'upcoming_notifications': summary_data.get('upcoming_notifications', []),
+            'complexity_breakdown': summary_data.get('complexity_breakdown', []),
+            'file_breakdown': summary_data.get('file_breakdown', []),
             'current_time': datetime.now().strftime(TEMPLATE_CONFIG['time_format'])
         })
 
@@ -94,45 +122,55 @@ def get_complexity_name(complexity: int) -> str:
     return complexity_map.get(complexity, 'Не указана')
 
 
-def get_summary_data(all_tasks):
+def get_summary_data(stats, timezone):
     """
-    Подготавливает данные для сводки по задачам
+    Подготавливает данные для сводки по задачам из счетчиков TaskStats.
+    Стоимость не зависит от размера хранилища: ближайшие напоминания
+    берутся из упорядоченного по времени индекса, а файлы с наибольшим числом
+    незавершенных задач - из рейтинга, который TaskStats поддерживает при изменениях.
+    Читается под stats.lock: счетчики обновляет поток обработки файлов.
     """
-    timezone = pytz.timezone('Europe/Samara')
-    now = datetime.now(timezone)
-
-    total_tasks = len(all_tasks)
-    completed_tasks = len([t for t in all_tasks if t.get('status') == 'DONE'])
-    pending_tasks = len([t for t in all_tasks if t.get('status') == 'TODO'])
-
-    # Ближайшие уведомления (в течение 24 часов)
-    upcoming_notifications = []
-
-    for task in all_tasks:
-        if (task.get('status') == 'TODO' and
-                task.get('notification') and
-                task.get('task')):
-            try:
-                notification_time = datetime.strptime(
-                    task['notification'],
-                    TEMPLATE_CONFIG['time_format']
-                )
-                notification_time = timezone.localize(notification_time)
-                if now <= notification_time <= now + timedelta(hours=24):
-                    upcoming_notifications.append({
-                        'task': task['task'][:50] + '...' if len(task['task']) > 50 else task['task'],
-                        'time': task['notification']
-                    })
-            except ValueError:
-                continue
-
-    # Сортируем и ограничиваем количество
-    upcoming_notifications.sort(key=lambda x: x['time'])
-    upcoming_notifications = upcoming_notifications[:TEMPLATE_CONFIG['summary_max_notifications']]
-
-    return {
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'upcoming_notifications': upcoming_notifications
-    }
\ No newline at end of file
+    with stats.lock:
+        now = datetime.now(timezone)
+
+        # Ближайшие уведомления (в течение 24 часов)
+        upcoming_notifications = [
+            {
+                'task': task.task[:50] + '...' if len(task.task) > 50 else task.task,
+                'time': task.notification
+            }
+            for task in stats.upcoming(now, now + timedelta(hours=24),
+                                       limit=TEMPLATE_CONFIG['summary_max_notifications'])
+        ]
+
+        # Разбивка по сложности (от высокой к низкой, без сложности - в конце)
+        complexity_breakdown = []
+        for complexity in (3, 2, 1, 0):
+            completed = stats.by_complexity.get((complexity, 'DONE'), 0)
+            pending = stats.by_complexity.get((complexity, 'TODO'), 0)
+            if completed or pending:
+                complexity_breakdown.append({
+                    'emoji': get_complexity_emoji(complexity),
+                    'name': get_complexity_name(complexity),
+                    'completed': completed,
+                    'pending': pending
+                })
+
+        # Файлы с наибольшим числом незавершенных задач
+        file_breakdown = [
+            {
+                'filename': os.path.basename(filename),
+                'pending': pending,
+                'completed': completed
+            }
+            for filename, pending, completed in stats.top_pending_files(TEMPLATE_CONFIG['summary_max_files'])
+        ]
+
+        return {
+            'total_tasks': stats.total,
+            'completed_tasks': stats.by_status.get('DONE', 0),
+            'pending_tasks': stats.by_status.get('TODO', 0),
+            'upcoming_notifications': upcoming_notifications,
+            'complexity_breakdown': complexity_breakdown,
+            'file_breakdown': file_breakdown
+        }
@@ -0,0 +1,121 @@
+"""
+Полнотекстовый индекс задач для поиска из бота
+"""
+
+import heapq
+import re
+import threading
+import time
+
+from sortedcontainers import SortedList
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# Слово запроса такой длины и длиннее ищется и как начало слов задачи ("счет" находит "счета")
+MIN_PREFIX_LENGTH = 3
+NO_VALUE = float('inf')
+
+
+def tokenize(text):
+    """Множество слов текста в нижнем регистре, ё приводится к е"""
+    return {token.replace('ё', 'е') for token in TOKEN_PATTERN.findall(text.casefold())}
+
+
+def search_sort_key(task):
+    # Незавершенные задачи первыми, дальше по дате выполнения и времени напоминания
+    return (
+        task.status != 'TODO',
+        task.due_day if task.due_day is not None else NO_VALUE,
+        task.notification_at.timestamp() if task.notification_at is not None else NO_VALUE,
+        task.filename,
+        task.id
+    )
+
+
+class TaskTextIndex:
+    """
+    Инвертированный индекс: слово очищенного текста задачи -> множество id задач.
+    Обновляется событиями TaskStore, поэтому изменение файла переиндексирует только его задачи.
+    Поиск пересекает списки задач слов запроса начиная с самого короткого,
+    его стоимость зависит от числа совпадений, а не от размера хранилища.
+    """
+
+    def __init__(self):
+        # id задачи -> задача
+        self._tasks = {}
+        # слово -> множество id задач
+        self._postings = {}
+        # Упорядоченный словарь слов для поиска по началу слова
+        self._words = SortedList()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.updated_at = None
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _add(self, task):
+        self._tasks[task.id] = task
+        for token in tokenize(task.task):
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                self._words.add(token)
+            ids.add(task.id)
+
+    def _remove(self, task):
+        if self._tasks.pop(task.id, None) is None:
+            return
+        for token in tokenize(task.task):
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(task.id)
+                if not ids:
+                    del self._postings[token]
+                    self._words.remove(token)
+
+    def apply_events(self, events):
+        """Применяет события изменения задач (подписчик TaskStore)"""
+        with self._lock:
+            for event in events:
+                if event.old is not None:
+                    self._remove(event.old)
+                if event.new is not None:
+                    self._add(event.new)
+            self.version += 1
+            self.updated_at = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self._postings.clear()
+            self._words.clear()
+            self.version += 1
+            self.updated_at = time.time()
+
+    def _postings_of(self, token):
+        """Списки задач слова token или (для длинных слов запроса) всех слов, начинающихся с него"""
+        if len(token) < MIN_PREFIX_LENGTH:
+            ids = self._postings.get(token)
+            return [ids] if ids else []
+        return [self._postings[word] for word in self._words.irange(token, token + '\uffff')]
+
+    def search(self, query, limit=10):
+        """
+        Ищет задачи, содержащие все слова запроса.
+        Возвращает (число найденных задач, первые limit задач в порядке search_sort_key).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+
+        with self._lock:
+            groups = sorted((self._postings_of(token) for token in tokens),
+                            key=lambda group: sum(len(ids) for ids in group))
+            matches = [group[0] if len(group) == 1 else set().union(*group) for group in groups]
+            # Перебираются задачи самого редкого слова, остальные слова проверяются по их множествам
+            smallest, others = matches[0], matches[1:]
+            tasks = self._tasks
+            found = [tasks[task_id] for task_id in smallest
+                     if all(task_id in ids for ids in others)]
+
+        return len(found), heapq.nsmallest(limit, found, key=search_sort_key)
@@ -0,0 +1,16 @@
+"""
+Общие настройки тестов: модули из src импортируются по имени, как в src/main.py
+"""
+
+import os
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_PATH))
+
+# main читает настройки из окружения при импорте: тесты не пишут кэши на диск
+os.environ.setdefault('PARSE_CACHE_PATH', '')
+os.environ.setdefault('SENT_STORE_PATH', '')
+os.environ.setdefault('TASK_EXPORT_PATH', '')
+os.environ.setdefault('VAULTS_CONFIG', '')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'test')
@@ -0,0 +1,87 @@
+"""
+Эталонный корпус строк задач: parse_obsidian_task должен давать те же поля,
+что и исходный построчный парсер (с учетом квадратов 🟨/🟥 в конце строки).
+"""
+
+import json
+import os
+import re
+
+import pytest
+
+import main
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# Ожидаемые значения получены при DURATION_TOMATO=30
+CORPUS_DURATION_TOMATO = 30
+
+
+def canonical_notification(value):
+    """
+    Время напоминания хранится в задаче как datetime и выводится как "ГГГГ-ММ-ДД ЧЧ:ММ",
+    а исходный парсер возвращал его как в тексте (с табуляцией или часом из одной цифры).
+    """
+    if value is None:
+        return None
+    day, hour, minute = re.fullmatch(r"(\S+)\s(\d{1,2}):(\d{2})", value).groups()
+    return f"{day} {int(hour):02d}:{minute}"
+
+
+def read_corpus():
+    with open(os.path.join(DATA_DIR, 'task_lines.txt'), encoding='utf-8', newline='') as f:
+        # Строки могут заканчиваться пробелами и табуляциями, поэтому только split('\n')
+        lines = f.read().split('\n')[:-1]
+    with open(os.path.join(DATA_DIR, 'task_lines.expected.jsonl'), encoding='utf-8') as f:
+        expected = [json.loads(line) for line in f]
+    for want in expected:
+        if 'notification' in want:
+            want['notification'] = canonical_notification(want['notification'])
+    assert len(lines) == len(expected)
+    return lines, expected
+
+
+def test_corpus_matches_reference_parser(monkeypatch):
+    monkeypatch.setattr(main, 'DURATION_TOMATO', CORPUS_DURATION_TOMATO)
+    lines, expected = read_corpus()
+
+    mismatches = []
+    for number, (line, want) in enumerate(zip(lines, expected), 1):
+        task = main.parse_obsidian_task(line, 'corpus.md')
+        got = task.as_dict() if task is not None else {}
+        if got != want:
+            mismatches.append((number, line, want, got))
+
+    assert not mismatches, "\n".join(
+        f"строка {number}: {line!r}\n  ожидалось {want}\n  получено  {got}"
+        for number, line, want, got in mismatches[:10])
+
+
+@pytest.mark.parametrize('line, complexity', [
+    ('- [ ] задача 🟨', 2),
+    ('- [ ] задача 🟥', 3),
+    ('- [ ] 🟩 задача', 1),
+    ('- [ ] задача 🟩 🟥', 3),
+])
+def test_complexity_square_at_line_end(line, complexity):
+    task = main.parse_obsidian_task(line)
+    assert task.complexity == complexity
+    assert task.task == 'задача'
+
+
+@pytest.mark.parametrize('data', [
+    b'# plan\n- [ ]\n- [ ] call bob\n',
+    b'# plan\r\n- [ ]\r\n- [ ] call bob',
+    b'# plan\r- [ ]\r- [ ] call bob\r',
+])
+@pytest.mark.parametrize('reader', [main.iter_task_lines, main.decode_task_lines])
+def test_bare_checkbox_is_empty_task(data, reader):
+    # Строки читаются с переводом строки, как в текстовом режиме:
+    # "- [ ]" в конце строки - задача с пустым текстом
+    tasks = [main.parse_obsidian_task(line) for line in reader(data)]
+    assert [task.task for task in tasks] == ['', 'call bob']
+
+
+def test_bare_checkbox_without_line_end_is_skipped():
+    # У последней строки без перевода строки текста нет, как и при чтении в текстовом режиме
+    for reader in (main.iter_task_lines, main.decode_task_lines):
+        assert [main.parse_obsidian_task(line) for line in reader(b'- [ ] call bob\n- [ ]')][1:] == [None]
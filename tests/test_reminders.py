@@ -0,0 +1,182 @@
+"""
+Повторная отправка напоминаний: стабильные id задач (match_tasks/diff_tasks),
+расписание (pop_due/restore) и отметки об отправке в SentStore после перезапуска.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from schedule import NotificationSchedule, notification_key
+from task_diff import diff_tasks, match_tasks
+
+FILENAME = 'plan.md'
+
+
+def reminder_time(vault, minutes):
+    """Время напоминания через minutes минут в формате задачи (с точностью до минуты)"""
+    return (datetime.now(vault.timezone) + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M')
+
+
+def parse_lines(lines, tz=main.timezone):
+    return [main.parse_obsidian_task(line, FILENAME, tz) for line in lines]
+
+
+def with_ids(tasks):
+    match_tasks([], tasks)
+    return tasks
+
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    """Подменяет отправку в Telegram: тексты сообщений собираются в список"""
+    messages = []
+
+    async def send_message(chat_id, text, parse_mode='Markdown'):
+        messages.append(text)
+        return True
+
+    monkeypatch.setattr(main.telegram_client, 'send_message', send_message)
+    return messages
+
+
+def make_vault(tmp_path):
+    vault = main.Vault('test', str(tmp_path), '1', 'Europe/Moscow',
+                       sent_store_path=str(tmp_path / 'cache' / 'sent.sqlite3'))
+    vault.sent.load()
+    return vault
+
+
+def write_file(vault, lines):
+    """Записывает файл и обновляет задачи хранилища, как обработчик событий"""
+    path = vault.normalize_path(FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{line}\n" for line in lines))
+    vault.tasks.replace_file(path, main.parse_obsidian_file(path, vault.path, vault.timezone))
+
+
+def tick(vault):
+    """Одна проверка напоминаний с ожиданием фоновых отправок"""
+    async def run():
+        main.check_vault_notifications(vault)
+        await asyncio.gather(*main.pending_sends)
+    asyncio.run(run())
+
+
+def test_text_edit_keeps_id_and_key():
+    old = with_ids(parse_lines(["- [ ] позвонить Боре (@2030-01-01 10:00)"]))
+    new = parse_lines(["- [ ] позвонить Боре насчет счета (@2030-01-01 10:00)"])
+
+    events = diff_tasks(FILENAME, old, new)
+
+    assert [event.kind for event in events] == ['updated']
+    assert new[0].id == old[0].id
+    assert notification_key(new[0]) == notification_key(old[0])
+
+
+def test_moving_reminder_changes_key():
+    old = with_ids(parse_lines(["- [ ] позвонить Боре (@2030-01-01 10:00)"]))
+    new = parse_lines(["- [ ] позвонить Боре (@2030-01-01 11:30)"])
+
+    events = diff_tasks(FILENAME, old, new)
+
+    assert [event.kind for event in events] == ['rescheduled']
+    assert new[0].id == old[0].id
+    assert notification_key(new[0]) != notification_key(old[0])
+
+
+def test_inserted_and_duplicate_tasks_keep_ids():
+    old = with_ids(parse_lines(["- [ ] купить хлеб", "- [ ] купить хлеб", "- [ ] полить цветы"]))
+    new = parse_lines(["- [ ] новая задача", "- [ ] купить хлеб", "- [x] полить цветы", "- [ ] купить хлеб"])
+
+    events = diff_tasks(FILENAME, old, new)
+
+    assert [new[1].id, new[3].id, new[2].id] == [task.id for task in old]
+    assert new[0].id not in {task.id for task in old}
+    assert sorted(event.kind for event in events) == ['added', 'completed']
+
+
+def test_pop_due_returns_reminders_inside_lead_window():
+    schedule = NotificationSchedule(main.timezone)
+    now = datetime.now(main.timezone).replace(second=0, microsecond=0)
+    lines = [f"- [ ] через {minutes} мин (@{(now + timedelta(minutes=minutes)):%Y-%m-%d %H:%M})"
+             for minutes in (3, 10)]
+    tasks = with_ids(parse_lines(lines))
+    schedule.apply_events(diff_tasks(FILENAME, [], tasks))
+
+    due = schedule.pop_due(now)
+
+    assert due == [(notification_key(tasks[0]), tasks[0])]
+    assert schedule.pop_due(now) == []
+    assert len(schedule) == 1
+
+
+def test_restore_skips_completed_tasks():
+    schedule = NotificationSchedule(main.timezone)
+    at = (datetime.now(main.timezone) + timedelta(minutes=3)).strftime('%Y-%m-%d %H:%M')
+    todo, done = with_ids(parse_lines([f"- [ ] задача (@{at})", f"- [x] готово (@{at})"]))
+
+    schedule.restore([todo, done])
+    schedule.restore([todo])
+
+    assert len(schedule) == 1
+
+
+def test_text_edit_does_not_resend(tmp_path, sent_messages):
+    vault = make_vault(tmp_path)
+    at = reminder_time(vault, 3)
+
+    write_file(vault, ["# план", f"- [ ] позвонить Боре (@{at})"])
+    tick(vault)
+    write_file(vault, ["# план", "- [ ] новая задача", f"- [ ] позвонить Боре насчет счета (@{at})"])
+    tick(vault)
+
+    assert len(sent_messages) == 1
+
+
+def test_moving_reminder_resends(tmp_path, sent_messages):
+    vault = make_vault(tmp_path)
+
+    write_file(vault, [f"- [ ] позвонить Боре (@{reminder_time(vault, 3)})"])
+    tick(vault)
+    write_file(vault, [f"- [ ] позвонить Боре (@{reminder_time(vault, 4)})"])
+    tick(vault)
+
+    assert len(sent_messages) == 2
+
+
+def test_restart_inside_lead_window_does_not_resend(tmp_path, sent_messages):
+    vault = make_vault(tmp_path)
+    lines = [f"- [ ] позвонить Боре (@{reminder_time(vault, 3)})"]
+    write_file(vault, lines)
+    tick(vault)
+    vault.sent.close()
+
+    # После перезапуска без кэша парсинга задачи получают новые id,
+    # отметки об отправке сопоставляются с ними по файлу, тексту и времени
+    restarted = main.Vault('test', str(tmp_path), '1', 'Europe/Moscow',
+                           sent_store_path=str(tmp_path / 'cache' / 'sent.sqlite3'))
+    write_file(restarted, lines)
+    restarted.sent.load(restarted.tasks)
+    tick(restarted)
+
+    assert len(sent_messages) == 1
+    restarted.sent.close()
+
+
+def test_failed_reminder_returns_to_schedule(tmp_path, monkeypatch):
+    async def send_message(chat_id, text, parse_mode='Markdown'):
+        return False
+
+    monkeypatch.setattr(main.telegram_client, 'send_message', send_message)
+    monkeypatch.setattr(main, 'NOTIFICATION_RETRY_SECONDS', 0)
+    vault = make_vault(tmp_path)
+
+    write_file(vault, [f"- [ ] позвонить Боре (@{reminder_time(vault, 3)})"])
+    tick(vault)
+
+    assert len(vault.sent) == 0
+    assert not vault.in_flight
+    assert len(vault.schedule) == 1
@@ -0,0 +1,203 @@
+"""
+TelegramClient и CommandBot против заглушки Bot API на aiohttp.web:
+повторы после 429 и 5xx, отказ после max_retries, ответы бота на команды.
+"""
+
+import asyncio
+
+from aiohttp import web
+
+from telegram_bot import CommandBot
+from telegram_client import TelegramClient
+
+TOKEN = 'test'
+
+
+class StubApi:
+    """
+    Заглушка Bot API: responder(method, payload) возвращает (HTTP-статус, JSON-ответ),
+    ответ-строка отправляется как есть.
+    Все запросы сохраняются в calls как (method, payload).
+    """
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.calls = []
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        payload = await request.json()
+        self.calls.append((method, payload))
+        status, body = self.responder(method, payload)
+        if isinstance(body, str):
+            return web.Response(text=body, status=status)
+        return web.json_response(body, status=status)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post(f'/bot{TOKEN}/{{method}}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+
+def make_client(url, max_retries=3):
+    client = TelegramClient(TOKEN, api_url=url, chat_interval=0, global_rate=1000,
+                            max_retries=max_retries, timeout=10)
+    # Без ожидания между повторами; задержка 429 берется из retry_after ответа
+    client._backoff = lambda attempt: 0
+    return client
+
+
+def scripted(responses):
+    """Отвечает по очереди заданными ответами, последний повторяется"""
+    def responder(method, payload):
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+    return responder
+
+
+OK = (200, {'ok': True, 'result': {}})
+
+
+def run_client(responses, method='sendMessage', payload=None, max_retries=3):
+    async def scenario():
+        async with StubApi(scripted(list(responses))) as stub:
+            client = make_client(stub.url, max_retries)
+            try:
+                result = await client.call(method, payload or {'chat_id': 1, 'text': 'x'})
+            finally:
+                await client.close()
+            return result, stub.calls
+    return asyncio.run(scenario())
+
+
+def test_retry_after_429():
+    too_many = (429, {'ok': False, 'parameters': {'retry_after': 0}})
+    result, calls = run_client([too_many, OK])
+    assert result == OK[1]
+    assert len(calls) == 2
+
+
+def test_backoff_on_server_error():
+    result, calls = run_client([(502, {'ok': False}), (500, {'ok': False}), OK])
+    assert result == OK[1]
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_retries():
+    result, calls = run_client([(503, {'ok': False})], max_retries=2)
+    assert result is None
+    assert len(calls) == 3
+
+
+def test_client_error_not_retried():
+    result, calls = run_client([(400, {'ok': False, 'description': 'bad request'}), OK])
+    assert result is None
+    assert len(calls) == 1
+
+
+def test_send_message_without_parse_mode():
+    async def scenario():
+        async with StubApi(scripted([OK])) as stub:
+            client = make_client(stub.url)
+            try:
+                assert await client.send_message(1, 'markdown')
+                assert await client.send_message(1, 'plain', parse_mode=None)
+            finally:
+                await client.close()
+            return stub.calls
+    calls = asyncio.run(scenario())
+    assert calls[0][1] == {'chat_id': 1, 'text': 'markdown', 'parse_mode': 'Markdown'}
+    assert calls[1][1] == {'chat_id': 1, 'text': 'plain'}
+
+
+def test_command_bot_replies_with_plain_text_fallback():
+    updates = [
+        {'update_id': 10, 'message': {'chat': {'id': 1}, 'text': '/find@obsidian_bot счет'}},
+        {'update_id': 11, 'message': {'chat': {'id': 2}, 'text': '/find чужой чат'}},
+        {'update_id': 12, 'message': {'chat': {'id': 1}, 'text': 'не команда'}},
+    ]
+    handled = []
+
+    def find(chat_id, args):
+        handled.append((chat_id, args))
+        return ['*незакрытая разметка']
+
+    def responder(method, payload):
+        if method == 'getUpdates':
+            result = updates if 'offset' not in payload else []
+            return 200, {'ok': True, 'result': result}
+        # Ошибка разметки Markdown: бот повторяет ответ обычным текстом
+        if 'parse_mode' in payload:
+            return 400, {'ok': False, 'description': "can't parse entities"}
+        return OK
+
+    async def scenario():
+        async with StubApi(responder) as stub:
+            client = make_client(stub.url)
+            bot = CommandBot(client, {'find': find}, allowed_chats=[1], poll_timeout=0, retry_delay=0)
+            task = asyncio.create_task(bot.run())
+            try:
+                for _ in range(200):
+                    if stub.methods().count('sendMessage') >= 2:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await client.close()
+            return bot, stub.calls
+
+    bot, calls = asyncio.run(scenario())
+    assert handled == [('1', 'счет')]
+    assert bot.offset == 13
+    sends = [payload for method, payload in calls if method == 'sendMessage']
+    assert sends[:2] == [
+        {'chat_id': '1', 'text': '*незакрытая разметка', 'parse_mode': 'Markdown'},
+        {'chat_id': '1', 'text': '*незакрытая разметка'},
+    ]
+    polls = [payload for method, payload in calls if method == 'getUpdates']
+    assert 'offset' not in polls[0]
+    assert polls[1]['offset'] == 13
+
+
+def test_command_bot_survives_invalid_response():
+    polls = []
+
+    def responder(method, payload):
+        polls.append(payload)
+        if len(polls) == 1:
+            # Ответ 200 не в формате JSON: call выбрасывает исключение разбора
+            return 200, '<html>bad gateway</html>'
+        return 200, {'ok': True, 'result': []}
+
+    async def scenario():
+        async with StubApi(responder) as stub:
+            client = make_client(stub.url)
+            bot = CommandBot(client, {}, allowed_chats=[1], poll_timeout=0, retry_delay=0)
+            task = asyncio.create_task(bot.run())
+            try:
+                for _ in range(200):
+                    if len(polls) >= 3:
+                        break
+                    await asyncio.sleep(0.01)
+                assert not task.done()
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await client.close()
+
+    asyncio.run(scenario())
+    assert len(polls) >= 3